@@ -1,7 +1,10 @@
 import streamlit as st
+import pandas as pd
+import logging
 import traceback
-from voiceover_main import get_gemini_client
-from helpers.gemini_helpers import add_elevenlabs_tags
+from helpers.gemini_helpers import get_gemini_client, stream_elevenlabs_tags_text, parse_refined_scenes
+
+log = logging.getLogger(__name__)
 
 def app_page():
     st.header("Step 3: Add ElevenLabs Audio Tags")
@@ -25,14 +28,17 @@ def app_page():
                 
                 st.write("🤖 Calling Gemini API to enhance voiceover...")
                 
-                # Direct API call
-                refined_scenes = add_elevenlabs_tags(
+                # Stream the tagged script into the status panel as Gemini writes it
+                script_text = st.write_stream(stream_elevenlabs_tags_text(
                     gemini_client=gemini_client,
                     scenes=st.session_state.scenes
-                )
+                ))
+                refined_scenes = parse_refined_scenes(script_text)
                 
                 st.session_state.refined_scenes = refined_scenes
                 st.session_state.scenes = refined_scenes
+                # Drop pending table edits so they aren't applied to the new scenes
+                st.session_state.pop("refined_editor", None)
                 
                 st.write(f"✅ Enhanced {len(refined_scenes)} scenes!")
                 status.update(label="✅ Audio tags complete!", state="complete")
@@ -42,85 +48,80 @@ def app_page():
             
         except Exception as e:
             st.session_state.is_processing = False
+            # Structured record for the server log; the formatted text is only built for the panel below
+            log.exception("Adding audio tags failed")
             st.error(f"❌ Error: {str(e)}")
             with st.expander("🔍 Error Details"):
-                st.code(traceback.format_exc())
+                st.code("".join(traceback.format_exception(e)))
             
-            if st.button("🔄 Retry Audio Tags"):
-                st.rerun()
+            # Clicking reruns the page on its own, which is all a retry needs
+            st.button("🔄 Retry Audio Tags")
 
     if 'refined_scenes' in st.session_state and st.session_state.refined_scenes:
         st.divider()
         st.subheader("📝 Review Final Script with Audio Tags")
         st.info(f"💡 Review the final scripts with audio tags. You can edit the tags before exporting.")
         
-        # Editable refined scenes
-        edited_refined = []
-        for i, scene in enumerate(st.session_state.refined_scenes):
-            with st.expander(
-                f"🎬 Scene {i+1}: {scene.get('comment', '')[:60]}...",
-                expanded=True
-            ):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.caption("**Original Speech**")
-                    st.text_area(
-                        "Original",
-                        value=scene.get('speech', ''),
-                        key=f"orig_{i}",
-                        height=100,
-                        disabled=True,
-                        label_visibility="collapsed"
-                    )
-                
-                with col2:
-                    st.caption("**With Audio Tags**")
-                    edited_elevenlabs = st.text_area(
-                        "ElevenLabs",
-                        value=scene.get('elevenlabs', ''),
-                        key=f"elevenlabs_{i}",
-                        height=120,
-                        label_visibility="collapsed",
+        # One table for all scenes instead of a pair of text areas per scene;
+        # inside a form so edits are submitted together
+        refined_df = pd.DataFrame(
+            st.session_state.refined_scenes,
+            columns=['comment', 'speech', 'elevenlabs']
+        )
+        refined_df['characters'] = refined_df['elevenlabs'].str.len()
+        
+        with st.form("refined_edit_form", clear_on_submit=False):
+            edited_df = st.data_editor(
+                refined_df,
+                disabled=['comment', 'speech', 'characters'],
+                column_config={
+                    'comment': st.column_config.TextColumn("Scene", width="small"),
+                    'speech': st.column_config.TextColumn("Original Speech", width="medium"),
+                    'elevenlabs': st.column_config.TextColumn(
+                        "With Audio Tags",
+                        width="large",
                         help="Edit audio tags and text"
-                    )
-                
-                st.caption(f"📏 Enhanced version: {len(edited_elevenlabs)} characters")
-                
-                edited_refined.append({
-                    'comment': scene.get('comment', ''),
-                    'speech': scene.get('speech', ''),
-                    'elevenlabs': edited_elevenlabs
-                })
+                    ),
+                    'characters': st.column_config.NumberColumn("📏 Characters", width="small"),
+                },
+                num_rows="fixed",
+                width="stretch",
+                key="refined_editor"
+            )
+            
+            # Continue is a submit button too, so unsaved edits are never left behind
+            col2, col3, col4 = st.columns([2, 2, 1])
+            
+            with col2:
+                save_edits = st.form_submit_button("💾 Save Final Edits", width="stretch")
+            
+            with col3:
+                final_approved = st.checkbox(
+                    "✓ Final Approval",
+                    help="Check to approve and enable export"
+                )
+            
+            with col4:
+                save_and_continue = st.form_submit_button("▶️ Continue", width="stretch")
+            
+            if save_edits or save_and_continue:
+                st.session_state.refined_scenes = edited_df.drop(columns='characters').to_dict('records')
+                if not save_and_continue:
+                    st.success("✅ Final edits saved!")
+                elif final_approved:
+                    st.switch_page("custom_pages/generate_elevenlabs_audio.py")
+                else:
+                    st.warning("⚠️ Edits saved. Check \"Final Approval\" to continue.")
         
         # Action buttons
         st.divider()
-        col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
-        
-        with col1:
-            if st.button("💾 Save Final Edits", width="stretch"):
-                st.session_state.refined_scenes = edited_refined
-                st.success("✅ Final edits saved!")
         
-        with col2:
-            if st.button("🔄 Regenerate Tags", width="stretch"):
-                # This effectively re-runs the current page, triggering regeneration
-                st.session_state.is_processing = False # Reset for next attempt
-                st.session_state.refined_scenes = None # Clear old refined scenes to force regeneration
-                st.rerun()
-        
-        with col3:
-            final_approved = st.checkbox(
-                "✓ Final Approval",
-                help="Check to approve and enable export"
-            )
+        def regenerate_callback():
+            """Clear the old tags before the click's own rerun redraws the page."""
+            st.session_state.is_processing = False # Reset for next attempt
+            st.session_state.refined_scenes = None # Clear old refined scenes to force regeneration
+            st.session_state.pop("refined_editor", None)
         
-        with col4:
-            if st.button(
-                "▶️ Continue",
-                disabled=not final_approved,
-                width="stretch"
-            ):
-                st.switch_page("custom_pages/generate_elevenlabs_audio.py")
+        st.button("🔄 Regenerate Tags", width="stretch", on_click=regenerate_callback)
 
 app_page()
@@ -1,20 +1,73 @@
 import streamlit as st
 import json
+import msgspec
 import uuid # Although not used directly in debug, kept for consistency if needed for keys
 
+# Keys hidden from the key inspector unless "Show all keys" is checked
+INTERNAL_KEYS = frozenset(['session_service', 'adk_session', 'creds'])
+
+# Number of list items rendered at once in the key inspector
+LIST_PAGE_SIZE = 50
+
+# Large values shown only by length, with their display label
+_TRUNCATE_KEYS = {'pdf_bytes': 'PDF bytes', 'audio': 'audio data'}
+_SIMPLE = (str, int, float, bool, type(None))
+_CONTAINER = (list, dict)
+
+
+def _state_version(key, value):
+    """Cheap change marker for a session state value."""
+    if isinstance(value, _SIMPLE):
+        return (key, hash(value))
+    if isinstance(value, _CONTAINER):
+        return (key, id(value), len(value))
+    return (key, id(value))
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _build_session_snapshot(versions_tuple, _state_items):
+    """Build the session state view as indented JSON text, cached by key versions."""
+    session_state_dict = {}
+    for key, value in _state_items:
+        # Handle non-serializable objects
+        if key in INTERNAL_KEYS:
+            session_state_dict[key] = f"<{type(value).__name__} object>"
+        elif key in _TRUNCATE_KEYS and value:
+            # Truncate large string data for display
+            session_state_dict[key] = f"<{_TRUNCATE_KEYS[key]}, {len(value)} chars>"
+        elif key == 'slides_data' and value:
+            # Show summary of slides data; the sample is rendered separately
+            session_state_dict[key] = {
+                "type": "list of slides",
+                "count": len(value)
+            }
+        elif isinstance(value, _SIMPLE):
+            session_state_dict[key] = value
+        elif isinstance(value, _CONTAINER):
+            # Containers are summarized; inspect them individually below
+            session_state_dict[key] = f"<{type(value).__name__}, {len(value)} items>"
+        else:
+            session_state_dict[key] = f"<{type(value).__name__}>"
+    return msgspec.json.format(msgspec.json.encode(session_state_dict), indent=2).decode()
+
+
 def app_page():
     st.header("Step 5: Debug - Session State Inspector")
     st.info("💡 View all session state variables and their values for debugging purposes.")
     
+    # Snapshot session state once per rerun
+    state_items = tuple(st.session_state.items())
+    keys = tuple(key for key, _ in state_items)
+    
     # Overview metrics
     st.subheader("📊 Session Overview")
     col1, col2 = st.columns(2)
     
     with col1:
-        st.metric("Session State Keys", len(st.session_state.keys()))
+        st.metric("Session State Keys", len(keys))
     
     with col2:
-        has_pdf = "✅" if "pdf_base64" in st.session_state and st.session_state.pdf_base64 else "❌"
+        has_pdf = "✅" if st.session_state.get("pdf_bytes") else "❌"
         st.metric("PDF Loaded", has_pdf)
     
     st.divider()
@@ -22,35 +75,19 @@ def app_page():
     # Display full session state
     st.subheader("🔍 Screen-Readable View of Session State")
     
-    # Create a JSON-serializable version of session state
-    session_state_dict = {}
-    for key in st.session_state.keys():
-        value = st.session_state[key]
-        
-        # Handle non-serializable objects
-        if key in ['session_service', 'adk_session', 'creds']:
-            session_state_dict[key] = f"<{type(value).__name__} object>"
-        elif key == 'pdf_base64' and value:
-            # Truncate base64 data for display
-            session_state_dict[key] = f"<base64 data, {len(value)} chars>"
-        elif key == 'slides_data' and value:
-            # Show summary of slides data
-            session_state_dict[key] = {
-                "type": "list of slides",
-                "count": len(value),
-                "sample": value[0] if value else None
-            }
-        elif key == 'audio' and value:
-            session_state_dict[key] = f"<audio data, {len(value)} chars>"
-        elif isinstance(value, (str, int, float, bool, type(None))):
-            session_state_dict[key] = value
-        elif isinstance(value, (list, dict)):
-            session_state_dict[key] = value
-        else:
-            session_state_dict[key] = f"<{type(value).__name__}>"
+    # Create a JSON-serializable version of session state, rebuilt only when a key changes
+    session_state_json = _build_session_snapshot(
+        tuple(_state_version(key, value) for key, value in state_items),
+        state_items
+    )
     
-    # Use st.json for pretty display
-    st.json(session_state_dict)
+    # Pre-serialized JSON, so st.code skips another conversion
+    st.code(session_state_json, language='json')
+    
+    # Only render the (potentially large) sample slide on request
+    if st.session_state.get('slides_data'):
+        if st.checkbox("Show sample slide", value=False):
+            st.json(st.session_state.slides_data[0])
     
     st.divider()
     
@@ -61,13 +98,12 @@ def app_page():
     show_all = st.checkbox("Show all keys (including internal)", value=False)
     
     # Get keys to display
-    all_keys = sorted(st.session_state.keys())
-    internal_keys = ['session_service', 'adk_session', 'creds', 'FormSubmitter']
+    all_keys = sorted(keys)
     
     if show_all:
         display_keys = all_keys
     else:
-        display_keys = [k for k in all_keys if not any(internal in k for internal in internal_keys)]
+        display_keys = [k for k in all_keys if k not in INTERNAL_KEYS and not k.startswith('FormSubmitter')]
     
     # Select a key to inspect
     if display_keys:
@@ -83,12 +119,19 @@ def app_page():
             if isinstance(value, (str, int, float, bool, type(None))):
                 st.write("**Value:**")
                 st.code(str(value))
+            elif isinstance(value, bytes):
+                st.write(f"**Value:** {len(value):,} bytes")
             elif isinstance(value, dict):
                 st.write("**Value (JSON):**")
                 st.json(value)
             elif isinstance(value, list):
                 st.write(f"**Value (List with {len(value)} items):**")
-                st.json(value)
+                # Render long lists one page at a time
+                if len(value) > LIST_PAGE_SIZE:
+                    start = st.slider("Start index", 0, len(value) - LIST_PAGE_SIZE, 0, key=f"debug_start_{selected_key}")
+                    st.json(value[start:start + LIST_PAGE_SIZE])
+                else:
+                    st.json(value)
             else:
                 st.write("**Value:**")
                 st.write(value)
@@ -105,15 +148,14 @@ def app_page():
     with col1:
         if st.button("🏠 Go to Start", width="stretch"):
             # Clear relevant session state here for a fresh start for the workflow
-            for key in ['slides_data', 'pdf_base64', 'scenes', 'refined_scenes', 'voiceover_approved', 'final_approved']:
+            for key in ['slides_data', 'pdf_bytes', 'scenes', 'refined_scenes', 'voiceover_approved', 'final_approved', '_session_initialized']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.switch_page("custom_pages/settings.py")
 
     with col2:
         if st.button("🔄 Reset All Session State Here", width="stretch"):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
+            st.session_state.clear()
             st.success("Session reset!")
             st.rerun()
 
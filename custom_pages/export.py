@@ -1,5 +1,25 @@
 import streamlit as st
-import json
+import msgspec
+from helpers.google_slides_helpers import as_data_uri
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _export_json(scenes, audio):
+    """Serialize and cache the JSON download for the given scenes and audio."""
+    output_json = {
+        'scenes': scenes,
+        'audio': audio,
+    }
+    return msgspec.json.format(msgspec.json.encode(output_json), indent=2)
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _summary(scenes_tuple):
+    """Scene count, total and average ElevenLabs characters from (comment, elevenlabs) pairs."""
+    total_chars = sum(len(elevenlabs) for _, elevenlabs in scenes_tuple)
+    num_scenes = len(scenes_tuple)
+    return num_scenes, total_chars, total_chars // num_scenes if num_scenes else 0
+
 
 def app_page():
 
@@ -20,18 +40,24 @@ def app_page():
         ):
             for i in range(len(st.session_state['slides_data'])):
                 img_base64 = st.session_state['slides_data'][i]['png_base64']
-                st.session_state['scenes'][i]["html"] = f"""<html><body><img style="width: 100%" src="{img_base64}" /></body></html>"""
+                if not img_base64:
+                    continue
+                st.session_state['scenes'][i]["html"] = f"""<html><body><img style="width: 100%" src="{as_data_uri(img_base64)}" /></body></html>"""
 
     st.success("🎉 Pipeline complete! Your voiceover scripts are ready.")
+    scenes_tuple = tuple(
+        (scene.get('comment', ''), scene.get('elevenlabs', ''))
+        for scene in st.session_state.refined_scenes
+    )
+    num_scenes, total_chars, avg_chars = _summary(scenes_tuple)
+    
     # Summary
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Scenes", len(st.session_state.refined_scenes))
+        st.metric("Total Scenes", num_scenes)
     with col2:
-        total_chars = sum(len(s.get('elevenlabs', '')) for s in st.session_state.refined_scenes)
         st.metric("Total Characters", f"{total_chars:,}")
     with col3:
-        avg_chars = total_chars // len(st.session_state.refined_scenes) if st.session_state.refined_scenes else 0
         st.metric("Avg per Scene", f"{avg_chars:,}")
     
     st.divider()
@@ -43,14 +69,9 @@ def app_page():
     
     with col1:
         # JSON export
-        output_json = {
-            'scenes': st.session_state.scenes,
-            'audio': st.session_state.audio,
-        }
-        
         st.download_button(
             label="📄 Download JSON",
-            data=json.dumps(output_json, indent=2),
+            data=_export_json(st.session_state.scenes, st.session_state.audio),
             file_name="voiceover_scenes.json",
             mime="application/json",
             width="stretch"
@@ -83,11 +104,10 @@ def app_page():
     # Start over button. This will reset relevant session state and navigate to the first page.
     if st.button("🔄 Create New Project", width="stretch", type="primary"):
         # Clear relevant session state here
-        for key in ['slides_data', 'audio', 'audio_scenes', 'pdf_base64', 'scenes', 'refined_scenes', 'voiceover_approved', 'final_approved']:
+        for key in ['slides_data', 'audio', 'audio_scenes', 'pdf_bytes', 'scenes', 'refined_scenes', 'voiceover_approved', 'final_approved', '_session_initialized']:
             if key in st.session_state:
                 del st.session_state[key]
-        # Rerun to clear page content and implicitely refresh navigation to main
+        # switch_page stops this run and reruns on the settings page, so no extra rerun is needed
         st.switch_page("custom_pages/settings.py")
-        st.rerun()
 
 app_page()
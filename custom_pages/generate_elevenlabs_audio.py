@@ -60,8 +60,8 @@ def app_page():
             with st.expander("🔍 Error Details"):
                 st.code(traceback.format_exc())
             
-            if st.button("🔄 Retry Audio Generation"):
-                st.rerun()
+            # Clicking reruns the page on its own, which is all a retry needs
+            st.button("🔄 Retry Audio Generation")
 
     if 'audio' in st.session_state and st.session_state.audio:
         st.divider()
@@ -1,13 +1,12 @@
 import streamlit as st
 import traceback
-from voiceover_main import get_gemini_client
-from helpers.gemini_helpers import generate_voiceover_scenes
+from helpers.gemini_helpers import get_gemini_client, stream_voiceover_text, parse_voiceover_scenes
 
 def app_page():
     st.header("Step 2: Generate Voiceover Script")
     st.info("💡 The AI will analyze your PDF slides and generate a voiceover script for each slide.")
     
-    if 'pdf_base64' not in st.session_state:
+    if not st.session_state.get('pdf_bytes'):
         st.error("❌ No PDF found in session. Please go back and upload a PDF.")
         if st.button("Upload PDF", type="secondary"):
             st.switch_page("custom_pages/upload.py")
@@ -27,11 +26,12 @@ def app_page():
                     
                     st.write("🤖 Calling Gemini API to analyze PDF...")
                     
-                    # Direct API call - no agent, no runner, no async complexity
-                    scenes = generate_voiceover_scenes(
+                    # Stream the script into the status panel as Gemini writes it
+                    script_text = st.write_stream(stream_voiceover_text(
                         gemini_client=gemini_client,
-                        pdf_base64=st.session_state.pdf_base64
-                    )
+                        pdf_bytes=st.session_state.pdf_bytes
+                    ))
+                    scenes = parse_voiceover_scenes(script_text)
                     
                     # Store in session state
                     st.session_state.scenes = scenes
@@ -52,78 +52,83 @@ def app_page():
                 with st.expander("🔍 Error Details"):
                     st.code(traceback.format_exc())
                 
-                if st.button("🔄 Retry Voiceover"):
-                    st.rerun()
+                # Clicking reruns the page on its own, which is all a retry needs
+                st.button("🔄 Retry Voiceover")
 
         if 'scenes' in st.session_state and st.session_state.scenes:
             st.divider()
             st.subheader("📝 Review & Edit Voiceover Script")
 
-            # Editable scenes
-            edited_scenes = []
-            for i, scene in enumerate(st.session_state.scenes):
-                with st.expander(
-                    f"🎬 Scene {i+1}: {scene.get('comment', '')[:60]}...",
-                    expanded=True
-                ):
-                    col1, col2 = st.columns([1, 3])
+            # Editable scenes, submitted together so typing doesn't rerun the page
+            with st.form("scenes_edit_form", clear_on_submit=False):
+                edited_scenes = []
+                for i, scene in enumerate(st.session_state.scenes):
+                    with st.expander(
+                        f"🎬 Scene {i+1}: {scene.get('comment', '')[:60]}...",
+                        expanded=True
+                    ):
+                        col1, col2 = st.columns([1, 3])
                     
-                    with col1:
-                        st.caption("**Scene Description**")
-                        edited_comment = st.text_area(
-                            "Comment",
-                            value=scene.get('comment', ''),
-                            key=f"comment_{i}",
-                            height=80,
-                            label_visibility="collapsed",
-                            help="Brief description of this scene"
-                        )
+                        with col1:
+                            st.caption("**Scene Description**")
+                            edited_comment = st.text_area(
+                                "Comment",
+                                value=scene.get('comment', ''),
+                                key=f"comment_{i}",
+                                height=80,
+                                label_visibility="collapsed",
+                                help="Brief description of this scene"
+                            )
                     
-                    with col2:
-                        st.caption("**Voiceover Text**")
-                        edited_speech = st.text_area(
-                            "Speech",
-                            value=scene.get('speech', ''),
-                            key=f"speech_{i}",
-                            height=120,
-                            label_visibility="collapsed",
-                            help="Edit the voiceover script"
-                        )
+                        with col2:
+                            st.caption("**Voiceover Text**")
+                            edited_speech = st.text_area(
+                                "Speech",
+                                value=scene.get('speech', ''),
+                                key=f"speech_{i}",
+                                height=120,
+                                label_visibility="collapsed",
+                                help="Edit the voiceover script"
+                            )
                     
-                    st.caption(f"📏 {len(edited_speech)} characters")
+                        st.caption(f"📏 {len(edited_speech)} characters")
                     
-                    edited_scenes.append({
-                        'comment': edited_comment,
-                        'speech': edited_speech
-                    })
+                        edited_scenes.append({
+                            'comment': edited_comment,
+                            'speech': edited_speech
+                        })
+                
+                # Continue is a submit button too, so unsaved edits are never left behind
+                col2, col3, col4 = st.columns([2, 2, 1])
+                
+                with col2:
+                    save_edits = st.form_submit_button("💾 Save Edits", width="stretch")
+                
+                with col3:
+                    voiceover_approved = st.checkbox(
+                        "✓ Approve & Continue",
+                        help="Check to approve and proceed to audio tag generation"
+                    )
+                
+                with col4:
+                    save_and_continue = st.form_submit_button("▶️ Continue", width="stretch")
+                
+                if save_edits or save_and_continue:
+                    st.session_state.scenes = edited_scenes
+                    if not save_and_continue:
+                        st.success("✅ Edits saved!")
+                    elif voiceover_approved:
+                        st.switch_page("custom_pages/add_audio_tags.py")
+                    else:
+                        st.warning("⚠️ Edits saved. Check \"Approve & Continue\" to proceed.")
             
             # Action buttons
             st.divider()
-            col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
-            
-            with col1:
-                if st.button("💾 Save Edits", width="stretch"):
-                    st.session_state.scenes = edited_scenes
-                    st.success("✅ Edits saved!")
-            
-            with col2:
-                if st.button("🔄 Regenerate Script", width="stretch"):
-                    # This effectively re-runs the current page, triggering regeneration
-                    st.session_state.is_processing = False # Reset for next attempt
-                    st.rerun()
             
-            with col3:
-                voiceover_approved = st.checkbox(
-                    "✓ Approve & Continue",
-                    help="Check to approve and proceed to audio tag generation"
-                )
+            def regenerate_callback():
+                """Reset the processing flag; the click's own rerun redraws the page."""
+                st.session_state.is_processing = False # Reset for next attempt
             
-            with col4:
-                if st.button(
-                    "▶️ Continue",
-                    disabled=not voiceover_approved,
-                    width="stretch"
-                ):
-                    st.switch_page("custom_pages/add_audio_tags.py")
+            st.button("🔄 Regenerate Script", width="stretch", on_click=regenerate_callback)
 
 app_page()
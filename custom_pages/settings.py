@@ -1,28 +1,15 @@
 import streamlit as st
-import json
-from google_auth_oauthlib.flow import Flow
+from helpers.google_auth_helpers import get_google_oauth_flow
 
-# ============================================
-# Google OAuth Configuration
-# ============================================
+# Sign-in button markup around the auth URL, so only one concatenation is needed
+_AUTH_BTN_PREFIX = '<a href="'
+_AUTH_BTN_SUFFIX = '"><button style="background-color: #4285F4; color: white; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; font-size: 14px; width: 100%;">Log in with Google</button></a>'
 
-SCOPES = [
-    'https://www.googleapis.com/auth/presentations.readonly',
-    'https://www.googleapis.com/auth/drive.readonly'
-]
-
-
-@st.cache_resource
-def get_google_oauth_flow():
-    """Create and return OAuth flow for Google authentication."""
-    client_config = json.loads(st.secrets["CLIENT_CONFIG"])
-    redirect_uri = st.secrets.get("REDIRECT_URI", "http://localhost:8501")
-    
-    return Flow.from_client_config(
-        client_config,
-        scopes=SCOPES,
-        redirect_uri=redirect_uri
-    )
+def sign_out():
+    """Forget the Google credentials; runs before the click's own rerun redraws the page."""
+    st.session_state.pop('creds', None)
+    # Generate a fresh sign-in URL for the next login
+    st.session_state.pop('_google_auth_url', None)
 
 def app_page():
 
@@ -30,17 +17,23 @@ def app_page():
     # Handle Google OAuth Callback
     # ==============================
     # Check if we are returning from Google Auth
-    if "code" in st.query_params and "creds" not in st.session_state:
+    # Signed-in sessions skip the query-params lookup entirely, and each code is
+    # exchanged at most once, so a failed code left in the URL is not retried
+    if (
+        "creds" not in st.session_state
+        and (auth_code := st.query_params.get("code"))
+        and auth_code != st.session_state.get("_oauth_code_consumed")
+    ):
+        st.session_state["_oauth_code_consumed"] = auth_code
         try:
             flow = get_google_oauth_flow()
-            flow.fetch_token(code=st.query_params["code"])
+            flow.fetch_token(code=auth_code)
             st.session_state.creds = flow.credentials
             # Clean the URL by removing the code
             st.query_params.clear()
             st.rerun()
         except Exception as e:
             st.error(f"Authentication error: {e}")
-            st.query_params.clear()
 
     st.subheader("Configure API Keys")
 
@@ -58,17 +51,18 @@ def app_page():
     if "creds" not in st.session_state:
         st.info("Not authenticated with Google. Required for Google Slides import.")
         try:
-            flow = get_google_oauth_flow()
-            auth_url, _ = flow.authorization_url(prompt='consent')
-            auth_link = f'<a href="{auth_url}"><button style="background-color: #4285F4; color: white; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; font-size: 14px; width: 100%;">Log in with Google</button></a>'
+            # Build the sign-in URL once per session instead of on every rerun
+            if '_google_auth_url' not in st.session_state:
+                flow = get_google_oauth_flow()
+                st.session_state['_google_auth_url'], _ = flow.authorization_url(prompt='consent')
+            auth_url = st.session_state['_google_auth_url']
+            auth_link = _AUTH_BTN_PREFIX + auth_url + _AUTH_BTN_SUFFIX
             st.markdown(auth_link, unsafe_allow_html=True)
         except Exception as e:
             st.error(f"Error setting up Google authentication: {e}")
     else:
         st.success("✅ Authenticated with Google")
-        if st.button("Sign out of Google", width="stretch"):
-            del st.session_state.creds
-            st.rerun()
+        st.button("Sign out of Google", width="stretch", on_click=sign_out)
 
     st.markdown("--- ")
 
@@ -1,7 +1,7 @@
 import streamlit as st
 import base64
 import traceback
-from helpers.google_slides_helpers import get_slides_data_cached, slides_to_pdf
+from helpers.google_slides_helpers import get_slides_data_batch, merge_slides_data, clear_slides_cache, slides_to_pdf
 # Assuming google auth flow is handled in main app and creds are in session state
 
 def app_page():
@@ -16,29 +16,38 @@ def app_page():
         presentation_id = st.text_input(
             "Google Slides Presentation ID:",
             placeholder="Enter the ID from the Google Slides URL",
-            help="Find the ID in the URL: https://docs.google.com/presentation/d/[ID]/edit"
+            help="Find the ID in the URL: https://docs.google.com/presentation/d/[ID]/edit. "
+                 "Separate several IDs with commas or spaces to import them as one deck."
         )
+        presentation_ids = presentation_id.replace(",", " ").split()
         
-        col1, col2 = st.columns([3, 1])
+        col1, col2, col3 = st.columns([2, 1, 1])
         with col1:
             load_slides_btn = st.button("📥 Load Slides", width="stretch")
         with col2:
+            refresh_slides_btn = st.button("🔄 Refresh Slides", width="stretch", help="Re-fetch slides, bypassing the cache")
+        with col3:
             if st.button("⏭️ Skip to Upload", width="stretch"):
                 st.switch_page("custom_pages/upload.py")
         
-        if load_slides_btn:
-            if not presentation_id:
+        if refresh_slides_btn:
+            clear_slides_cache()
+        
+        if load_slides_btn or refresh_slides_btn:
+            if not presentation_ids:
                 st.warning("⚠️ Please enter a valid Presentation ID.")
             else:
                 with st.spinner("Loading slides data..."):
                     try:
-                        # Load slides using cached function
+                        # Load slides using cached function; several decks are fetched concurrently
                         # Assumes get_google_oauth_flow or similar is available from main and creds are in session_state
-                        slides_data = get_slides_data_cached(presentation_id, st.session_state.creds)
+                        decks = get_slides_data_batch(presentation_ids, st.session_state.creds)
+                        failed = [pid for pid, deck in zip(presentation_ids, decks) if deck is None]
                         
-                        if slides_data is None:
-                            st.error("Failed to load slides data. Please check the Presentation ID and permissions.")
+                        if failed:
+                            st.error(f"Failed to load slides data for: {', '.join(failed)}. Please check the Presentation ID and permissions.")
                         else:
+                            slides_data = merge_slides_data(decks)
                             st.session_state.slides_data = slides_data
                             st.success(f"✅ Successfully loaded {len(slides_data)} slides!")
                             st.rerun()
@@ -51,20 +60,22 @@ def app_page():
             st.subheader(f"📝 Edit Slides ({len(st.session_state.slides_data)} slides)")
             
             # Define callback to remove a slide
-            def remove_slide_callback(slide_index):
-                """Remove a slide from slides_data and re-index."""
-                st.session_state.slides_data = [
-                    slide for slide in st.session_state.slides_data
-                    if slide["index"] != slide_index
-                ]
-                # Re-index remaining slides
-                for i, slide in enumerate(st.session_state.slides_data):
-                    slide["index"] = i
+            def remove_slide_callback(pos):
+                """Remove the slide at list position pos and re-index."""
+                slides = st.session_state.slides_data
+                del slides[pos]
+                # Only the slides after the removed one change position
+                for i in range(pos, len(slides)):
+                    slides[i]["index"] = i
+            
+            def update_notes_callback(pos):
+                """Copy one edited notes widget back into slides_data."""
+                slide = st.session_state.slides_data[pos]
+                slide["notes"] = st.session_state[f"notes_{slide['index']}"]
             
-            # Display each slide in an expander
-            for idx, slide_item in enumerate(st.session_state.slides_data):
-                # Use a copy for display to avoid modifying object during iteration, if necessary
-                slide = slide_item.copy()
+            # Display each slide in an expander; the list is only mutated in
+            # callbacks, which run before this loop, so no per-slide copy is needed
+            for idx, slide in enumerate(st.session_state.slides_data):
                 slide_index = slide["index"]
                 
                 with st.expander(f"Slide {idx + 1}", expanded=True):
@@ -74,8 +85,7 @@ def app_page():
                         # Display slide thumbnail
                         if slide.get("png_base64"):
                             try:
-                                image_html = f"<img src='{slide['png_base64']}' style='width:100%; height:auto;' />"
-                                st.markdown(image_html, unsafe_allow_html=True)
+                                st.image(base64.b64decode(slide["png_base64"]), width="stretch")
                             except Exception as e:
                                 st.warning(f"Could not display thumbnail: {e}")
                     
@@ -83,15 +93,16 @@ def app_page():
                         # Edit speaker notes
                         st.markdown("**Speaker Notes:**")
                         # Assign unique key to text_area
-                        new_notes = st.text_area(
+                        st.text_area(
                             "Edit notes:",
                             value=slide.get("notes", ""),
                             height=150,
                             key=f"notes_{slide_index}",
-                            label_visibility="collapsed"
+                            label_visibility="collapsed",
+                            # Write back only when this slide's notes change
+                            on_change=update_notes_callback,
+                            args=(idx,)
                         )
-                        # Update notes in current slide_item (original object reference)
-                        st.session_state.slides_data[idx]["notes"] = new_notes
                     
                     with col3:
                         st.button(
@@ -113,7 +124,7 @@ def app_page():
                         try:
                             # Generate PDF from slides
                             pdf_base64 = slides_to_pdf(st.session_state.slides_data)
-                            st.session_state.pdf_base64 = pdf_base64
+                            st.session_state.pdf_bytes = base64.b64decode(pdf_base64)
                             st.success("✅ PDF generated successfully!")
                             st.rerun()
                         except Exception as e:
@@ -122,23 +133,21 @@ def app_page():
                                 st.code(traceback.format_exc())
             
             with col2:
-                if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+                if st.session_state.get("pdf_bytes"):
                     if st.button("▶️ Continue to Upload", width="stretch"):
                         st.switch_page("custom_pages/upload.py")
             
             # Display PDF preview if available
-            if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+            if st.session_state.get("pdf_bytes"):
                 st.divider()
                 st.subheader("📄 PDF Preview")
                 
-                # Decode base64 to bytes for display
-                bytes = base64.b64decode(st.session_state.pdf_base64)
-                st.pdf(bytes, height=700)
+                st.pdf(st.session_state.pdf_bytes, height=700)
                 
                 # Download button
                 st.download_button(
                     label="📥 Download PDF",
-                    data=pdf_bytes,
+                    data=st.session_state.pdf_bytes,
                     file_name="slides_presentation.pdf",
                     mime="application/pdf",
                     width="stretch"
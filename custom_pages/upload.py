@@ -1,19 +1,16 @@
 import streamlit as st
-import base64
-from voiceover_main import process_pdf # Assuming process_pdf is in voiceover_main.py
 
 def app_page():
     st.header("Step 1: Upload PDF Slide Deck")
     st.info("💡 Upload a PDF containing your educational slides. The AI will analyze each slide and generate voiceover scripts.")
     
-    if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+    if st.session_state.get("pdf_bytes"):
         st.success("✅ PDF already uploaded.")
         
         col1, col2 = st.columns([3, 1])
         with col1:
             st.caption("📄 Uploaded PDF Preview:")
-            bytes = base64.b64decode(st.session_state.pdf_base64)
-            st.pdf(bytes, height=700)
+            st.pdf(st.session_state.pdf_bytes, height=700)
         
         with col2:
             # Link to the next step
@@ -27,14 +24,14 @@ def app_page():
         )
         
         if uploaded_file:
-            pdf_data = process_pdf(uploaded_file.read())
-            st.session_state.pdf_base64 = pdf_data['base64']
+            # Keep the raw bytes; base64 would inflate session state by a third
+            st.session_state.pdf_bytes = uploaded_file.read()
             
             col1, col2, col3 = st.columns([2, 2, 1])
             with col1:
                 st.success(f"✅ **Uploaded:** {uploaded_file.name}")
             with col2:
-                st.caption(f"📦 **Size:** {pdf_data['size']:,} bytes")
+                st.caption(f"📦 **Size:** {len(st.session_state.pdf_bytes):,} bytes")
             with col3:
                 # Link to the next step
                 if st.button("▶️ Next", width="stretch"):
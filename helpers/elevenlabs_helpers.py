@@ -36,7 +36,7 @@ EXPECT_CONTROL_ALIGNMENT_DATA = False
 # Helper Functions
 # ============================================================================
 
-@st.cache_resource
+@st.cache_resource(max_entries=1)
 def get_elevenlabs_client():
     """Initialize and cache the ElevenLabs client."""
     api_key = st.secrets.get("ELEVENLABS_API_KEY", None)
@@ -8,9 +8,9 @@ This module provides simplified functions for:
 Uses direct Gemini SDK calls (no ADK framework).
 """
 
-import base64
 import json
-from typing import List
+from typing import Iterator, List
+import streamlit as st
 from google import genai
 from google.genai import types
 from pydantic import BaseModel, Field
@@ -423,26 +423,37 @@ You will receive an object (dictionary), with an array of objects, where each ob
 GEMINI_MODEL = "gemini-2.5-flash"
 
 # ============================================
-# Main Functions
+# Helper Functions
 # ============================================
 
-def generate_voiceover_scenes(gemini_client: genai.Client, pdf_base64: str) -> list[dict]:
-    """
-    Generate voiceover scenes from a PDF using Gemini API.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_gemini_client():
+    """Initialize and cache the Gemini client."""
+    api_key = st.secrets.get("GEMINI_API_KEY", None)
+    if not api_key:
+        api_key = st.session_state.get("gemini_api_key", None)
     
-    Args:
-        gemini_client: Initialized genai.Client instance
-        pdf_base64: Base64-encoded PDF bytes
-        
-    Returns:
-        List of scene dictionaries with 'comment' and 'speech' keys
-        
-    Raises:
-        Exception: If API call fails or response parsing fails
+    if not api_key:
+        st.error("❌ GEMINI_API_KEY not found in Streamlit secrets or session state. Please add it.")
+        st.stop()
+    return genai.Client(api_key=api_key)
+
+
+def _scenes_from_response(response) -> list[dict]:
     """
-    # Decode PDF from base64
-    pdf_bytes = base64.b64decode(pdf_base64)
-    
+    Read scenes from a structured-output response.
+    The SDK has already validated the JSON into the response_schema model,
+    so use that instead of parsing response.text a second time.
+    """
+    if response.parsed is not None:
+        return [scene.model_dump() for scene in response.parsed.scenes]
+    # Fallback when the SDK could not validate the payload against the schema
+    data = json.loads(response.text)
+    return data.get("scenes", [])
+
+
+def _voiceover_request(pdf_bytes: bytes) -> tuple[list, types.GenerateContentConfig]:
+    """Build the contents and config shared by the blocking and streaming calls."""
     # Build content parts for the API call
     contents = [
         "Analyze the slides in this PDF and generate voiceover scripts.",
@@ -458,6 +469,41 @@ def generate_voiceover_scenes(gemini_client: genai.Client, pdf_base64: str) -> l
         response_schema=SceneList,
         system_instruction=VOICEOVER_SYSTEM_PROMPT
     )
+    return contents, config
+
+
+def _elevenlabs_tags_request(scenes: list[dict]) -> tuple[str, types.GenerateContentConfig]:
+    """Build the contents and config shared by the blocking and streaming tag calls."""
+    # Format scenes as JSON string
+    json_str = json.dumps({"scenes": scenes})
+    
+    # Configure structured output generation
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=RefinedSceneList,
+        system_instruction=ELEVENLABS_SYSTEM_PROMPT
+    )
+    return json_str, config
+
+# ============================================
+# Main Functions
+# ============================================
+
+def generate_voiceover_scenes(gemini_client: genai.Client, pdf_bytes: bytes) -> list[dict]:
+    """
+    Generate voiceover scenes from a PDF using Gemini API.
+    
+    Args:
+        gemini_client: Initialized genai.Client instance
+        pdf_bytes: Raw PDF bytes
+        
+    Returns:
+        List of scene dictionaries with 'comment' and 'speech' keys
+        
+    Raises:
+        Exception: If API call fails or response parsing fails
+    """
+    contents, config = _voiceover_request(pdf_bytes)
     
     # Call Gemini API
     response = gemini_client.models.generate_content(
@@ -467,8 +513,46 @@ def generate_voiceover_scenes(gemini_client: genai.Client, pdf_base64: str) -> l
     )
     
     # Parse and return scenes
-    data = json.loads(response.text)
-    return data.get("scenes", [])
+    return _scenes_from_response(response)
+
+
+def stream_voiceover_text(gemini_client: genai.Client, pdf_bytes: bytes) -> Iterator[str]:
+    """
+    Stream the raw JSON text of a voiceover script as Gemini generates it.
+    
+    Same request as generate_voiceover_scenes, but yields text chunks as they
+    arrive so the UI can show progress (e.g. with st.write_stream). Pass the
+    concatenated text to parse_voiceover_scenes once the stream ends.
+    
+    Args:
+        gemini_client: Initialized genai.Client instance
+        pdf_bytes: Raw PDF bytes
+        
+    Yields:
+        Chunks of the JSON response text
+    """
+    contents, config = _voiceover_request(pdf_bytes)
+    
+    for chunk in gemini_client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=contents,
+        config=config
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
+def parse_voiceover_scenes(text: str) -> list[dict]:
+    """
+    Parse a streamed voiceover script into scene dictionaries.
+    
+    Args:
+        text: Full JSON text produced by stream_voiceover_text
+        
+    Returns:
+        List of scene dictionaries with 'comment' and 'speech' keys
+    """
+    return [scene.model_dump() for scene in SceneList.model_validate_json(text).scenes]
 
 
 def add_elevenlabs_tags(gemini_client: genai.Client, scenes: list[dict]) -> list[dict]:
@@ -485,15 +569,7 @@ def add_elevenlabs_tags(gemini_client: genai.Client, scenes: list[dict]) -> list
     Raises:
         Exception: If API call fails or response parsing fails
     """
-    # Format scenes as JSON string
-    json_str = json.dumps({"scenes": scenes})
-    
-    # Configure structured output generation
-    config = types.GenerateContentConfig(
-        response_mime_type="application/json",
-        response_schema=RefinedSceneList,
-        system_instruction=ELEVENLABS_SYSTEM_PROMPT
-    )
+    json_str, config = _elevenlabs_tags_request(scenes)
     
     # Call Gemini API
     response = gemini_client.models.generate_content(
@@ -503,5 +579,43 @@ def add_elevenlabs_tags(gemini_client: genai.Client, scenes: list[dict]) -> list
     )
     
     # Parse and return refined scenes
-    data = json.loads(response.text)
-    return data.get("scenes", [])
+    return _scenes_from_response(response)
+
+
+def stream_elevenlabs_tags_text(gemini_client: genai.Client, scenes: list[dict]) -> Iterator[str]:
+    """
+    Stream the raw JSON text of the tagged script as Gemini generates it.
+    
+    Same request as add_elevenlabs_tags, but yields text chunks as they
+    arrive. Pass the concatenated text to parse_refined_scenes once the
+    stream ends.
+    
+    Args:
+        gemini_client: Initialized genai.Client instance
+        scenes: List of scene dictionaries with 'comment' and 'speech' keys
+        
+    Yields:
+        Chunks of the JSON response text
+    """
+    json_str, config = _elevenlabs_tags_request(scenes)
+    
+    for chunk in gemini_client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=json_str,
+        config=config
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
+def parse_refined_scenes(text: str) -> list[dict]:
+    """
+    Parse a streamed tagged script into refined scene dictionaries.
+    
+    Args:
+        text: Full JSON text produced by stream_elevenlabs_tags_text
+        
+    Returns:
+        List of refined scene dictionaries with 'comment', 'speech' and 'elevenlabs' keys
+    """
+    return [scene.model_dump() for scene in RefinedSceneList.model_validate_json(text).scenes]
@@ -0,0 +1,33 @@
+import json
+import streamlit as st
+
+
+# ============================================
+# Google OAuth Configuration
+# ============================================
+
+SCOPES = [
+    'https://www.googleapis.com/auth/presentations.readonly',
+    'https://www.googleapis.com/auth/drive.readonly'
+]
+
+
+@st.cache_resource(show_spinner=False)
+def get_google_oauth_flow():
+    """
+    Create and return OAuth flow for Google authentication.
+    
+    Shared by every app entry point, so the client config is parsed and the
+    Flow built once per process no matter which script asks for it.
+    """
+    # Imported on first use; the OAuth stack is only needed for sign-in
+    from google_auth_oauthlib.flow import Flow
+    
+    client_config = json.loads(st.secrets["CLIENT_CONFIG"])
+    redirect_uri = st.secrets.get("REDIRECT_URI", "http://localhost:8501")
+    
+    return Flow.from_client_config(
+        client_config,
+        scopes=SCOPES,
+        redirect_uri=redirect_uri
+    )
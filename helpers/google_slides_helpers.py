@@ -1,39 +1,93 @@
 from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+import binascii
+import hashlib
 import io
+import logging
+import os
+import secrets
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# for HTML to PDF
-from xhtml2pdf import pisa
+# Number of slide thumbnails fetched concurrently
+THUMBNAIL_WORKERS = 16
 
+# Number of presentations fetched concurrently in a batch import
+PRESENTATION_WORKERS = 4
 
-@st.cache_resource
-def _build_slides_service(_creds):
+# Maximum sub-requests packed into one Slides API batch call
+THUMBNAIL_BATCH_SIZE = 100
+
+# Bytes read per chunk when streaming a thumbnail (a multiple of 3 for base64)
+THUMBNAIL_CHUNK_SIZE = 64 * 1024 - (64 * 1024) % 3
+
+PNG_DATA_URI_PREFIX = 'data:image/png;base64,'
+
+# Session state key holding this session's refresh nonce, part of the slides cache key
+SLIDES_REFRESH_KEY = '_slides_refresh_nonce'
+
+# Shared read-only defaults for missing fields in API responses
+_EMPTY_DICT = {}
+_EMPTY_TUPLE = ()
+
+# Quiet by default; set SLIDES_LOG_LEVEL=DEBUG to trace per-slide progress
+log = logging.getLogger(__name__)
+log.setLevel(os.environ.get("SLIDES_LOG_LEVEL", "WARNING"))
+
+
+@st.cache_resource(max_entries=4)
+def _build_slides_service(creds_token, _creds):
     """
     Build and cache the Google Slides API service.
     
     Cached as a resource to avoid rebuilding the service on every API call.
-    The underscore prefix on _creds prevents caching based on credentials,
-    allowing the service to be reused across credential objects.
+    The service is keyed on the access token, so each user's credentials get
+    their own service; the underscore prefix keeps _creds out of the hash.
+    Uses the bundled discovery document instead of fetching it.
     
     Args:
+        creds_token: Access token of _creds, used as the cache key
         _creds: Google OAuth2 credentials
         
     Returns:
         Google Slides API service object
     """
-    return build('slides', 'v1', credentials=_creds)
+    return build('slides', 'v1', credentials=_creds, cache_discovery=False, static_discovery=True)
 
 
-def get_slides_data(presentation_id, creds):
+def _new_slides_service(creds):
+    """
+    Build an uncached Slides API service with its own HTTP connection.
+    
+    googleapiclient services share one httplib2.Http, which is not thread-safe,
+    so each concurrent worker needs a service of its own instead of the cached one.
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    return build(
+        'slides', 'v1',
+        http=AuthorizedHttp(creds, http=httplib2.Http()),
+        cache_discovery=False,
+        static_discovery=True
+    )
+
+
+def get_slides_data(presentation_id, creds, service=None):
     """
     Orchestrates the fetching of speaker notes and thumbnails, returning a
     single JSON object.
+    
+    Pass service to use a specific Slides API service (e.g. one per worker
+    thread); by default the cached per-token service is used.
     """
-    notes_list = get_all_speaker_notes(presentation_id, creds)
-    pngs = get_all_pngs_from_presentation(presentation_id, creds)
+    if service is None:
+        service = _build_slides_service(creds.token, creds)
+    notes_list = get_all_speaker_notes(presentation_id, creds, service)
+    pngs = get_all_pngs_from_presentation(presentation_id, creds, service)
 
     if notes_list is None or pngs is None:
         return None # Or raise an exception
@@ -49,80 +103,207 @@ def get_slides_data(presentation_id, creds):
     return slides_data
 
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_slides_data_cached(presentation_id, _creds):
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)  # Cache for 1 hour, at most 4 decks
+def _get_slides_data_for_token(presentation_id, token_key, refresh_nonce, _creds, _service=None):
+    """
+    Cached call to get_slides_data, keyed on the presentation and a digest
+    of the access token so one user's deck is never served to another, plus
+    the session's refresh nonce (see clear_slides_cache).
+    The underscore prefix on _creds and _service prevents them from being hashed.
+    """
+    return get_slides_data(presentation_id, _creds, _service)
+
+
+def get_slides_data_cached(presentation_id, creds, service=None):
     """
     Cached wrapper for get_slides_data.
     
     Uses @st.cache_data with a 1-hour TTL to avoid re-fetching the same
-    presentation data on every rerun. The underscore prefix on _creds
-    prevents it from being used as part of the cache key.
+    presentation data on every rerun, and keeps at most four presentations
+    so thumbnail-heavy decks don't accumulate in memory.
     
     Args:
         presentation_id: The Google Slides presentation ID
-        _creds: Google OAuth2 credentials (not part of cache key)
+        creds: Google OAuth2 credentials (only a token digest is used as cache key)
+        service: Optional Slides API service to fetch with on a cache miss
         
     Returns:
         List of slide data dictionaries or None if error
     """
-    return get_slides_data(presentation_id, _creds)
+    token_key = hashlib.sha256(creds.token.encode()).hexdigest()
+    refresh_nonce = st.session_state.get(SLIDES_REFRESH_KEY, '')
+    return _get_slides_data_for_token(presentation_id, token_key, refresh_nonce, creds, service)
+
+
+def _fetch_deck(presentation_id, creds, service=None):
+    """Fetch one deck for a batch import, returning None instead of raising."""
+    try:
+        return get_slides_data_cached(presentation_id, creds, service)
+    except Exception:
+        log.exception("Failed to load presentation %s", presentation_id)
+        return None
+
+
+def get_slides_data_batch(presentation_ids, creds):
+    """
+    Fetch several presentations concurrently through get_slides_data_cached.
+    
+    Each deck is dominated by Google API round trips, so fetching them in
+    parallel makes the batch take about as long as the slowest deck rather
+    than the sum of all of them. Worker threads are attached to the current
+    script run so the progress messages written while fetching still render,
+    and each builds its own Slides service because the shared one is not
+    thread-safe. A deck that raises is logged and returned as None.
+    
+    Args:
+        presentation_ids: Google Slides presentation IDs, in display order
+        creds: Google OAuth2 credentials
+        
+    Returns:
+        List of slide data lists (None for any deck that failed), in the
+        same order as presentation_ids
+    """
+    if len(presentation_ids) == 1:
+        return [_fetch_deck(presentation_ids[0], creds)]
+
+    ctx = get_script_run_ctx()
+
+    def _fetch(presentation_id):
+        add_script_run_ctx(ctx=ctx)
+        return _fetch_deck(presentation_id, creds, _new_slides_service(creds))
+
+    with ThreadPoolExecutor(max_workers=min(PRESENTATION_WORKERS, len(presentation_ids))) as executor:
+        return list(executor.map(_fetch, presentation_ids))
+
+
+def merge_slides_data(decks):
+    """Concatenate slide lists from several decks and re-index them in order."""
+    merged = [slide for deck in decks for slide in deck]
+    for i, slide in enumerate(merged):
+        slide["index"] = i
+    return merged
+
+
+def clear_slides_cache():
+    """
+    Make this session's next load re-fetch from the API.
+    A new nonce in the cache key bypasses only this session's entries; other
+    users' cached decks are untouched and the stale ones age out on the TTL.
+    """
+    st.session_state[SLIDES_REFRESH_KEY] = secrets.token_hex(8)
+
+
+def _get_thumbnail_urls(service, presentation_id, slides):
+    """
+    Request every slide's thumbnail metadata through batched Slides API calls.
+
+    Returns a dict mapping slide index to its temporary contentUrl.
+    """
+    content_urls = {}
+
+    def _on_thumbnail(request_id, response, exception):
+        if exception is not None:
+            log.warning("Thumbnail request %s failed: %s", request_id, exception)
+        elif response.get('contentUrl'):
+            content_urls[int(request_id)] = response['contentUrl']
+
+    for start in range(0, len(slides), THUMBNAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_on_thumbnail)
+        for i, slide in enumerate(slides[start:start + THUMBNAIL_BATCH_SIZE], start=start):
+            batch.add(
+                service.presentations().pages().getThumbnail(
+                    presentationId=presentation_id,
+                    pageObjectId=slide['objectId'],
+                    thumbnailProperties_thumbnailSize='LARGE',
+                    thumbnailProperties_mimeType='PNG'
+                ),
+                request_id=str(i)
+            )
+        batch.execute()
+
+    return content_urls
+
+
+def as_data_uri(png_base64):
+    """Turn a stored base64 PNG into a data URI for HTML/CSS consumers."""
+    return PNG_DATA_URI_PREFIX + png_base64
 
 
-def get_all_pngs_from_presentation(presentation_id, creds):
+def _download_thumbnail(i, image_content_url, creds, session):
+    """Download one thumbnail and return it as (index, base64 PNG)."""
+    # Authentication is required for the temporary contentUrl
+    image_response = session.get(
+        image_content_url,
+        headers={'Authorization': f'Bearer {creds.token}'},
+        stream=True
+    )
+    image_response.raise_for_status() # Check for HTTP errors
+
+    # Encode while streaming so the raw image is never held in full;
+    # only 3-byte aligned slices are encoded until the final remainder
+    parts = []
+    remainder = b''
+    for chunk in image_response.iter_content(THUMBNAIL_CHUNK_SIZE):
+        chunk = remainder + chunk
+        cut = len(chunk) - len(chunk) % 3
+        parts.append(binascii.b2a_base64(chunk[:cut], newline=False))
+        remainder = chunk[cut:]
+    parts.append(binascii.b2a_base64(remainder, newline=False))
+
+    return i, b''.join(parts).decode('ascii')
+
+
+def get_all_pngs_from_presentation(presentation_id, creds, service=None):
     """
     Retrieves all slide thumbnails as PNG images from a Google Presentation.
+
+    Thumbnail metadata is fetched in batched API calls, then the images are
+    downloaded concurrently and returned in slide order. The list always has
+    one entry per slide; a thumbnail that could not be fetched is an empty
+    string so the remaining images stay aligned with their speaker notes.
     """
     # Use cached service builder for better performance
-    service = _build_slides_service(creds)
+    if service is None:
+        service = _build_slides_service(creds.token, creds)
 
     presentation = service.presentations().get(presentationId=presentation_id).execute()
     slides = presentation.get('slides', [])
 
-    png_images = []
-
-    for i, slide in enumerate(slides):
-        # Get the thumbnail for each slide
-        thumbnail = service.presentations().pages().getThumbnail(
-            presentationId=presentation_id,
-            pageObjectId=slide['objectId'],
-            thumbnailProperties_thumbnailSize='LARGE',
-            thumbnailProperties_mimeType='PNG'
-        ).execute()
-
-        image_content_url = thumbnail.get('contentUrl')
-        if image_content_url:
-            # 4. Fetch the image data from the contentUrl
-            # Authentication is required for the temporary contentUrl
-            image_response = requests.get(
-                image_content_url,
-                headers={'Authorization': f'Bearer {creds.token}'},
-                stream=True
-            )
-            image_response.raise_for_status() # Check for HTTP errors
+    content_urls = _get_thumbnail_urls(service, presentation_id, slides)
+    for i in range(len(slides)):
+        if i not in content_urls:
+            log.warning("No contentUrl found for slide %d thumbnail.", i + 1)
 
-            # 5. Encode to Base64
-            base64_bytes = base64.b64encode(image_response.content)
-            base64_string = base64_bytes.decode('utf-8')
+    # Share pooled connections across the worker threads
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=THUMBNAIL_WORKERS, pool_maxsize=2 * THUMBNAIL_WORKERS))
 
-            # Prepend Data URI scheme
-            data_uri = f'data:image/png;base64,{base64_string}'
+    thumbnails = {}
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as executor:
+        futures = [
+            executor.submit(_download_thumbnail, i, url, creds, session)
+            for i, url in content_urls.items()
+        ]
+        debug = log.isEnabledFor(logging.DEBUG)
+        for future in as_completed(futures):
+            i, png_base64 = future.result()
+            thumbnails[i] = png_base64
+            if debug:
+                log.debug("Slide %d thumbnail generated (%d chars).", i + 1, len(png_base64))
 
-            png_images.append(data_uri)
-            # print(f"  ✅ Success: Base64 thumbnail generated ({len(base64_string)} chars).")
-            st.write(f"  ✅ Success: Slide {i+1} thumbnail generated ({len(base64_string)} chars).")
-        else:
-            print("  ❌ Failure: No contentUrl found for thumbnail.")
+    st.write(f"✅ Generated {len(thumbnails)} of {len(slides)} slide thumbnails.")
 
-    return png_images
+    return [thumbnails.get(i, "") for i in range(len(slides))]
 
 
-def get_all_speaker_notes(presentation_id, creds):
+def get_all_speaker_notes(presentation_id, creds, service=None):
     """
     Retrieves the speaker notes for every slide in a Google Presentation,
     with added DEBUG logging.
     """
     # Use cached service builder for better performance
-    service = _build_slides_service(creds)
+    if service is None:
+        service = _build_slides_service(creds.token, creds)
 
     # 🛑 DEBUG POINT 0: Confirm service object creation
     # print(f"--- Service created for Presentation ID: {presentation_id} ---")
@@ -155,24 +336,26 @@ def get_all_speaker_notes(presentation_id, creds):
     all_notes = []
 
     for slide in slides_data:
-        notes_page = slide.get("slideProperties", {}).get("notesPage", {})
+        notes_page = (slide.get("slideProperties") or _EMPTY_DICT).get("notesPage") or _EMPTY_DICT
+        page_elements = notes_page.get("pageElements") or _EMPTY_TUPLE
         note_texts = []
 
-        for elem in notes_page.get("pageElements", []):
+        for elem in page_elements:
             shape = elem.get("shape")
             if not shape:
                 continue
 
-            placeholder = shape.get("placeholder", {})
+            placeholder = shape.get("placeholder") or _EMPTY_DICT
             # Speaker notes text box
             if placeholder.get("type") != "BODY":
                 continue
 
-            text = shape.get("text", {})
-            for te in text.get("textElements", []):
-                text_run = te.get("textRun")
-                if text_run and "content" in text_run:
-                    note_texts.append(text_run["content"])
+            text = shape.get("text") or _EMPTY_DICT
+            note_texts += [
+                text_run["content"]
+                for te in text.get("textElements") or _EMPTY_TUPLE
+                if (text_run := te.get("textRun")) and "content" in text_run
+            ]
 
         # Join & clean text
         full_text = "".join(note_texts).strip()
@@ -187,18 +370,21 @@ def slides_to_pdf(slides):
     slides: list of dicts like:
       [{ "png_base64": "...", "notes": "..." }, ...]
     """
-    rows_html = ""
-    for slide in slides:
-        rows_html += f"""
+    # Collect rows and join once; repeated += copies the growing string,
+    # which gets expensive because every row embeds a full base64 thumbnail
+    rows_html = "".join([
+        f"""
         <tr>
           <td style="width: 40%">
-            <img src="{slide['png_base64']}" />
+            <img src="{as_data_uri(slide['png_base64'])}" />
           </td>
           <td style="width: 60%">
             {slide['notes'].replace('\n', '<br/>')}
           </td>
         </tr>
         """
+        for slide in slides
+    ])
 
     html = f"""
 <!DOCTYPE html>
@@ -224,6 +410,9 @@ def slides_to_pdf(slides):
 </body>
 </html>
 """
+    # xhtml2pdf pulls in reportlab, so load it only when a PDF is actually built
+    from xhtml2pdf import pisa
+    
     pdf_io = io.BytesIO()
-    pisa.CreatePDF(io.StringIO(html), dest=pdf_io)
-    return base64.b64encode(pdf_io.getvalue()).decode("utf-8")
\ No newline at end of file
+    pisa.CreatePDF(html, dest=pdf_io)
+    return binascii.b2a_base64(pdf_io.getvalue(), newline=False).decode("ascii")
\ No newline at end of file
@@ -1,8 +1,9 @@
 import streamlit as st
 import json
-from google_auth_oauthlib.flow import Flow
 import base64
+import hashlib
 from helpers.google_slides_helpers import get_slides_data_cached, slides_to_pdf
+from helpers.google_auth_helpers import get_google_oauth_flow as get_flow
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -11,31 +12,32 @@ st.set_page_config(
     layout="wide"  # Makes content fill the screen width
 )
 
-# --- GOOGLE OAUTH CONFIGURATION ---
-SCOPES = [
-    'https://www.googleapis.com/auth/presentations.readonly',
-    'https://www.googleapis.com/auth/drive.readonly'
-]
+# --- CACHED PDF HELPERS ---
+def _hash_pdf_bytes(pdf_bytes):
+    """Cheap fixed-size digest used as the cache key for PDF bytes."""
+    return hashlib.blake2b(pdf_bytes, digest_size=16).digest()
 
-@st.cache_resource
-def get_flow():
-    """Create and return OAuth flow for Google authentication.
-    
-    Cached as a resource since Flow objects are expensive to create
-    and can be reused across sessions.
+def session_pdf_key():
+    """Digest of the session's PDF, computed once per bytes object rather than every rerun."""
+    pdf_bytes = st.session_state.pdf_bytes
+    cached = st.session_state.get('_pdf_key')
+    if cached is None or cached[0] is not pdf_bytes:
+        cached = (pdf_bytes, _hash_pdf_bytes(pdf_bytes))
+        st.session_state._pdf_key = cached
+    return cached[1]
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def pdf_iframe_html(pdf_key, _pdf_bytes):
     """
-    # Load client config from Streamlit Secrets
-    client_config = json.loads(st.secrets["CLIENT_CONFIG"])
-    
-    # The redirect_uri must match exactly what is in your Google Cloud Console
-    # For local testing, use http://localhost:8501
-    redirect_uri = st.secrets.get("REDIRECT_URI", "http://localhost:8501")
-    
-    return Flow.from_client_config(
-        client_config,
-        scopes=SCOPES,
-        redirect_uri=redirect_uri
-    )
+    Build the data-URI preview iframe once per PDF instead of on every rerun.
+    Keyed on pdf_key (see session_pdf_key); the underscore keeps the bytes out of the hash.
+    """
+    pdf_base64 = base64.b64encode(_pdf_bytes).decode('ascii')
+    return f'<iframe src="data:application/pdf;base64,{pdf_base64}" width="100%" height="800px" type="application/pdf"></iframe>'
+
+def sign_out():
+    """Forget the Google credentials; runs before the click's own rerun redraws the page."""
+    st.session_state.pop("creds", None)
 
 # --- SESSION STATE INITIALIZATION ---
 if "slides_data" not in st.session_state:
@@ -43,17 +45,23 @@ if "slides_data" not in st.session_state:
 
 # --- HANDLE GOOGLE OAUTH CALLBACK ---
 # Check if we are returning from Google Auth
-if "code" in st.query_params and "creds" not in st.session_state:
+# Signed-in sessions skip the query-params lookup entirely, and each code is
+# exchanged at most once, so a failed code left in the URL is not retried
+if (
+    "creds" not in st.session_state
+    and (auth_code := st.query_params.get("code"))
+    and auth_code != st.session_state.get("_oauth_code_consumed")
+):
+    st.session_state["_oauth_code_consumed"] = auth_code
     try:
         flow = get_flow()
-        flow.fetch_token(code=st.query_params["code"])
+        flow.fetch_token(code=auth_code)
         st.session_state.creds = flow.credentials
         # Clean the URL by removing the code
         st.query_params.clear()
         st.rerun()
     except Exception as e:
         st.error(f"Authentication error: {e}")
-        st.query_params.clear()
 
 # --- SIDEBAR: GOOGLE AUTHENTICATION ---
 with st.sidebar:
@@ -75,9 +83,7 @@ with st.sidebar:
             st.error(f"Error setting up Google authentication: {e}")
     else:
         st.success("✅ Authenticated with Google")
-        if st.button("Sign out of Google"):
-            del st.session_state.creds
-            st.rerun()
+        st.button("Sign out of Google", on_click=sign_out)
 
 # --- MAIN SCREEN ---
 st.title("📊 Google Slides Manager")
@@ -126,14 +132,17 @@ if st.session_state.slides_data:
     
     # Define callback function to remove a slide
     def remove_slide(slide_index):
-        """Remove a slide from slides_data and re-index remaining slides."""
-        st.session_state.slides_data = [
-            slide for slide in st.session_state.slides_data
-            if slide["index"] != slide_index
-        ]
-        # Re-index remaining slides
-        for i, slide in enumerate(st.session_state.slides_data):
-            slide["index"] = i
+        """Remove a slide from slides_data in place and re-index the rest."""
+        slides = st.session_state.slides_data
+        # index always matches list position, so remove by position
+        del slides[slide_index]
+        # Only the slides after the removed one change position
+        for i in range(slide_index, len(slides)):
+            slides[i]["index"] = i
+    
+    def update_notes(slide_index):
+        """Copy one edited notes widget back into slides_data."""
+        st.session_state.slides_data[slide_index]["notes"] = st.session_state[f"notes_{slide_index}"]
     
     # Create expanders for each slide
     for slide in st.session_state.slides_data:
@@ -146,24 +155,22 @@ if st.session_state.slides_data:
                 if slide.get("png_base64"):
                     try:
                         # Decode base64 image and display
-                        # image_data = base64.b64decode(slide["png_base64"])
-                        image_html = f"<img src='{slide['png_base64']}' style='width:100%; height:auto;' />"
-                        st.markdown(image_html, unsafe_allow_html=True)
+                        st.image(base64.b64decode(slide["png_base64"]), width="stretch")
                     except Exception as e:
                         st.warning(f"Could not display thumbnail: {e}")
             with col2:
                 # Edit speaker notes
                 st.markdown("**Speaker Notes:**")
-                new_notes = st.text_area(
+                # Notes are written back by the on_change callback, only when edited
+                st.text_area(
                     "Edit notes:",
                     value=slide.get("notes", ""),
                     height=150,
                     key=f"notes_{slide_index}",
-                    label_visibility="collapsed"
+                    label_visibility="collapsed",
+                    on_change=update_notes,
+                    args=(slide_index,)
                 )
-                # Update notes in session state if changed
-                if new_notes != slide.get("notes", ""):
-                    st.session_state.slides_data[slide_index]["notes"] = new_notes
             with col3:
                 st.button(
                     "🗑️ Remove",
@@ -191,22 +198,21 @@ if st.session_state.slides_data:
         with st.spinner("Generating PDF..."):
             try:
                 # Call slides_to_pdf function
+                # Keep raw bytes in session state; base64 is a third larger
                 pdf_base64 = slides_to_pdf(st.session_state.slides_data)
-                st.session_state.pdf_base64 = pdf_base64
+                st.session_state.pdf_bytes = base64.b64decode(pdf_base64)
                 st.success("✅ PDF generated successfully!")
                 st.rerun()
             except Exception as e:
                 st.error(f"Error generating PDF: {e}")
     
     # Display PDF if available
-    if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+    if st.session_state.get("pdf_bytes"):
         st.subheader("Generated PDF")
-        # Decode base64 to bytes for display
-        pdf_bytes = base64.b64decode(st.session_state.pdf_base64)
+        pdf_bytes = st.session_state.pdf_bytes
         
         # Display PDF using iframe with data URI
-        pdf_display = f'<iframe src="data:application/pdf;base64,{st.session_state.pdf_base64}" width="100%" height="800px" type="application/pdf"></iframe>'
-        st.markdown(pdf_display, unsafe_allow_html=True)
+        st.markdown(pdf_iframe_html(session_pdf_key(), pdf_bytes), unsafe_allow_html=True)
         
         # Also provide download button
         st.download_button(
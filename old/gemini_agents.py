@@ -1,23 +1,24 @@
 #Utility
 import json
-import os.path
-import requests
-import base64
+import asyncio
 import io
+import hashlib
 import os
-import copy
-import uuid
-import re
+import tempfile
+import logging
+import threading
+import time
+from collections import OrderedDict
 
-# for Google Slides speaker notes
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+# For splitting large decks into page ranges
+from pypdf import PdfReader, PdfWriter
 
 # For Google Gemini things
 from google import genai
 from google.genai import types
+from google.genai import errors
 from pydantic import BaseModel, Field
+import msgspec
 from typing import List
 from google.genai.types import GenerateContentConfig, ThinkingConfig
 
@@ -400,6 +401,19 @@ GEMINI_CLIENT = genai.Client(
     )
 GEMINI_MODEL = "gemini-2.5-flash"
 
+log = logging.getLogger(__name__)
+
+# --- Background event loop ---
+# One long-lived loop on a daemon thread. Reusing it skips the loop setup and
+# teardown of asyncio.run() on every call and keeps the async Gemini client's
+# connections alive between calls.
+_BG_LOOP = asyncio.new_event_loop()
+threading.Thread(target=_BG_LOOP.run_forever, name="gemini-agents-loop", daemon=True).start()
+
+def run_coro(coro):
+  """Run a coroutine on the background loop and block until it finishes."""
+  return asyncio.run_coroutine_threadsafe(coro, _BG_LOOP).result()
+
 ## GENERATE INITIAL VOICEOVER FROM PDF
 
 # --- Structured Output ---
@@ -414,48 +428,119 @@ class SceneList(BaseModel):
     """A list of one or more scenes."""
     scenes: List[Scene]
 
-def gemini_voiceover(pdf_base64):
+# 3. msgspec mirrors of the schema above, used to decode the response.
+#    The pydantic models are still what Gemini receives as response_schema.
+class SceneStruct(msgspec.Struct):
+    comment: str
+    speech: str
+
+class SceneListStruct(msgspec.Struct):
+    scenes: List[SceneStruct]
+
+# --- Uploaded PDFs ---
+# Maps sha256(pdf_bytes) -> (uploaded Gemini file, upload time) so a PDF is
+# sent over the wire once and later calls (retries, refinements) reference it
+# by URI. Files API uploads expire after 48 hours, so entries are re-uploaded
+# a little before that, and only the most recently used PDFs are kept.
+PDF_FILE_TTL_SECONDS = 46 * 60 * 60
+PDF_FILE_CACHE_MAX = 64
+PDF_FILE_CACHE = OrderedDict()
+_PDF_FILE_CACHE_LOCK = threading.Lock()
+
+def upload_pdf(pdf_bytes, force=False):
+  pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+  with _PDF_FILE_CACHE_LOCK:
+    entry = PDF_FILE_CACHE.get(pdf_hash)
+    if entry is not None and not force and time.monotonic() - entry[1] < PDF_FILE_TTL_SECONDS:
+      PDF_FILE_CACHE.move_to_end(pdf_hash)
+      return entry[0]
+
+  file = GEMINI_CLIENT.files.upload(
+      file=io.BytesIO(pdf_bytes),
+      config={"mime_type": "application/pdf"}
+  )
+  with _PDF_FILE_CACHE_LOCK:
+    PDF_FILE_CACHE[pdf_hash] = (file, time.monotonic())
+    PDF_FILE_CACHE.move_to_end(pdf_hash)
+    while len(PDF_FILE_CACHE) > PDF_FILE_CACHE_MAX:
+      PDF_FILE_CACHE.popitem(last=False)
+  return file
+
+# --- Page-range chunking ---
+# Large decks are split into page ranges that are generated concurrently,
+# so wall-clock time tracks the slowest chunk rather than the whole deck.
+PAGES_PER_CHUNK = 10
+
+def split_pdf(pdf_bytes, pages_per_chunk=PAGES_PER_CHUNK):
+  reader = PdfReader(io.BytesIO(pdf_bytes))
+  chunks = []
+  for start in range(0, len(reader.pages), pages_per_chunk):
+    writer = PdfWriter()
+    for page in reader.pages[start:start + pages_per_chunk]:
+      writer.add_page(page)
+    buf = io.BytesIO()
+    writer.write(buf)
+    chunks.append(buf.getvalue())
+  return chunks
+
+async def _voiceover_chunk(chunk_index, chunk_bytes, generate_content_config):
+  pdf_file = await asyncio.to_thread(upload_pdf, chunk_bytes)
+
+  prompt = "Analyze the slides in this PDF and generate voiceover scripts."
+  if chunk_index > 0:
+    prompt += " These slides continue an earlier part of the same deck, so do not re-introduce the topic."
+
+  async def _generate(pdf_file):
+    # Build the formatted parts for Gemini API
+    formatted_parts = [
+        prompt,
+        types.Part.from_uri(
+            file_uri=pdf_file.uri,
+            mime_type=pdf_file.mime_type
+        )
+    ]
+
+    return await GEMINI_CLIENT.aio.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=formatted_parts,
+        config=generate_content_config
+    )
 
-  #pdf_base64 = CORE_OBJ["pdf_base64"]
-  pdf_mime_type = "application/pdf"
-  pdf_bytes = base64.b64decode(pdf_base64)
+  try:
+    response = await _generate(pdf_file)
+  except errors.ClientError as e:
+    # An expired or deleted upload comes back as not found / permission denied
+    if e.code not in (403, 404):
+      raise
+    log.info("Uploaded PDF chunk %d is no longer available; uploading it again.", chunk_index)
+    pdf_file = await asyncio.to_thread(upload_pdf, chunk_bytes, True)
+    response = await _generate(pdf_file)
 
-  # Build the formatted parts for Gemini API
-  formatted_parts = [
-      "Analyze the slides in this PDF and generate voiceover scripts.",
-      types.Part.from_bytes(
-          data=pdf_bytes,
-          mime_type=pdf_mime_type
-      )
-  ]
+  data = msgspec.json.decode(response.text, type=SceneListStruct)
+  return data.scenes
+
+async def gemini_voiceover_async(pdf_bytes, pages_per_chunk=PAGES_PER_CHUNK):
+  # Takes raw PDF bytes; callers no longer base64-encode just for this to decode
+  chunks = split_pdf(pdf_bytes, pages_per_chunk)
 
-  generate_content_config = types.GenerateContentConfig(
+  generate_content_config = GenerateContentConfig(
       response_mime_type="application/json",
       response_schema=SceneList,
-      system_instruction=SYSTEM_PROMPTS['pdf-to-voiceover']
-  )
-
-  print("🔄 Generating voiceover script from PDF...")
-  response = GEMINI_CLIENT.models.generate_content(
-      model=GEMINI_MODEL,
-      contents=formatted_parts,
-      config=generate_content_config
+      system_instruction=SYSTEM_PROMPTS['pdf-to-voiceover'],
+      thinking_config=ThinkingConfig(thinking_budget=512)
   )
 
+  log.info("Generating voiceover script from PDF in %d chunk(s)...", len(chunks))
+  # gather() returns results in submission order, which keeps scenes in slide order
+  chunk_scenes = await asyncio.gather(*[
+      _voiceover_chunk(i, chunk, generate_content_config)
+      for i, chunk in enumerate(chunks)
+  ])
 
-  # Store the response text
-  voiceover_response = response.text
+  return msgspec.to_builtins([scene for scenes in chunk_scenes for scene in scenes])
 
-  # print("\n✅ Voiceover script generated!")
-  # print("\n" + "="*80)
-  # print("RESPONSE FROM CELL 1:")
-  # print("="*80)
-  # print(voiceover_response)
-  # print("="*80)
-
-  data = json.loads(voiceover_response)
-
-  return data["scenes"]
+def gemini_voiceover(pdf_bytes):
+  return run_coro(gemini_voiceover_async(pdf_bytes))
 
 ## GENERATE ELEVENLABS VOICEOVER REFINEMENT
 
@@ -472,37 +557,140 @@ class RefinedSceneList(BaseModel):
     """A list of one or more scenes."""
     scenes: List[RefinedScene]
 
-def generate_elevenlabs_speech(scenes):
-  json_str = "{\"scenes\":" + json.dumps(scenes) + "}"
+# 3. msgspec mirrors used to decode the response
+class RefinedSceneStruct(msgspec.Struct):
+    comment: str
+    speech: str
+    elevenlabs: str
+
+class RefinedSceneListStruct(msgspec.Struct):
+    scenes: List[RefinedSceneStruct]
+
+# --- Per-scene cache ---
+# Maps sha256(speech) -> elevenlabs string so that re-running the refinement
+# after human edits only sends new or modified scenes to Gemini. The file lives
+# next to this module unless EL_SCENE_CACHE_PATH points elsewhere, keeps only
+# the most recently used scenes, and is rewritten atomically after each update.
+EL_SCENE_CACHE_PATH = os.environ.get(
+    "EL_SCENE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "el_scene_cache.json")
+)
+EL_SCENE_CACHE_MAX = 5000
+_EL_SCENE_CACHE_LOCK = threading.Lock()
+
+def _load_el_scene_cache():
+  try:
+    with open(EL_SCENE_CACHE_PATH, "r", encoding="utf-8") as f:
+      entries = json.load(f)
+  except (OSError, ValueError):
+    return OrderedDict()
+  # The file is written oldest first, so the tail is the most recently used
+  return OrderedDict(list(entries.items())[-EL_SCENE_CACHE_MAX:])
+
+EL_SCENE_CACHE: OrderedDict[str, str] = _load_el_scene_cache()
+
+def _save_el_scene_cache():
+  # Write to a temp file in the same directory, then swap it in, so a crash
+  # mid-write never leaves a truncated cache behind
+  directory = os.path.dirname(EL_SCENE_CACHE_PATH) or "."
+  tmp_path = None
+  try:
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+      json.dump(EL_SCENE_CACHE, f)
+    os.replace(tmp_path, EL_SCENE_CACHE_PATH)
+  except OSError:
+    log.warning("Could not save Elevenlabs scene cache to %s", EL_SCENE_CACHE_PATH, exc_info=True)
+    if tmp_path is not None:
+      try:
+        os.remove(tmp_path)
+      except OSError:
+        pass
+
+def _update_el_scene_cache(fresh):
+  with _EL_SCENE_CACHE_LOCK:
+    for key, elevenlabs in fresh.items():
+      EL_SCENE_CACHE[key] = elevenlabs
+      EL_SCENE_CACHE.move_to_end(key)
+    while len(EL_SCENE_CACHE) > EL_SCENE_CACHE_MAX:
+      EL_SCENE_CACHE.popitem(last=False)
+    _save_el_scene_cache()
+
+def _speech_key(speech):
+  return hashlib.sha256(speech.encode("utf-8")).hexdigest()
+
+# A response that does not map one-to-one onto the requested scenes is retried
+EL_MAX_ATTEMPTS = 2
+
+def _match_key(speech):
+  # Whitespace-insensitive, so re-wrapped echoes of the speech still match
+  return " ".join(speech.split())
+
+def _refine_scenes(miss):
+  """
+  Tag the given scenes with one Gemini call and return {speech_key: elevenlabs}.
+  Results are matched back to their input on the echoed speech, so a merged,
+  split, dropped or reordered scene raises instead of being cached under the
+  wrong speech.
+  """
+  json_str = "{\"scenes\":" + json.dumps(miss) + "}"
 
   # Build the formatted parts for Gemini API
   formatted_parts = [
       json_str
   ]
 
-  generate_content_config = types.GenerateContentConfig(
+  generate_content_config = GenerateContentConfig(
       response_mime_type="application/json",
       response_schema=RefinedSceneList,
-      system_instruction=SYSTEM_PROMPTS['elevenlabs']
+      system_instruction=SYSTEM_PROMPTS['elevenlabs'],
+      # Tagging is mechanical string augmentation; thinking adds latency, not quality
+      thinking_config=ThinkingConfig(thinking_budget=0)
   )
 
-  print("🔄 Generating Elevenlabs refinements...")
   response = GEMINI_CLIENT.models.generate_content(
       model=GEMINI_MODEL,
       contents=formatted_parts,
       config=generate_content_config
   )
 
+  data = msgspec.json.decode(response.text, type=RefinedSceneListStruct)
+  if len(data.scenes) != len(miss):
+    raise ValueError(f"Gemini returned {len(data.scenes)} refined scenes for {len(miss)} inputs")
 
-  # Store the response text
-  elevenlabs_response = response.text
-
-  # print("\n✅ Elevenlabs Voiceover script generated!")
-  # print("\n" + "="*80)
-  # print(elevenlabs_response)
-  # print("="*80)
-
-  data = json.loads(elevenlabs_response)
-  return data["scenes"]
-
+  refined_by_match = {_match_key(refined.speech): refined.elevenlabs for refined in data.scenes}
+  refined = {}
+  for scene in miss:
+    elevenlabs = refined_by_match.get(_match_key(scene["speech"]))
+    if elevenlabs is None:
+      raise ValueError(f"Gemini returned no refined scene for: {scene['speech'][:60]!r}")
+    refined[_speech_key(scene["speech"])] = elevenlabs
+  return refined
 
+def generate_elevenlabs_speech(scenes):
+  keys = [_speech_key(scene["speech"]) for scene in scenes]
+  with _EL_SCENE_CACHE_LOCK:
+    refined = {key: EL_SCENE_CACHE[key] for key in keys if key in EL_SCENE_CACHE}
+    # Hits count as use, so scenes still being worked on are evicted last
+    for key in refined:
+      EL_SCENE_CACHE.move_to_end(key)
+  miss = [scene for scene, key in zip(scenes, keys) if key not in refined]
+
+  if miss:
+    log.info("Generating Elevenlabs refinements for %d/%d scenes...", len(miss), len(scenes))
+    for attempt in range(1, EL_MAX_ATTEMPTS + 1):
+      try:
+        fresh = _refine_scenes(miss)
+        break
+      except ValueError as e:
+        if attempt == EL_MAX_ATTEMPTS:
+          raise
+        log.warning("Discarding mismatched Elevenlabs refinement (%s); retrying.", e)
+    _update_el_scene_cache(fresh)
+    refined.update(fresh)
+
+  # Stitch cached and fresh results back together in the original order
+  return [
+      {**scene, "elevenlabs": refined[key]}
+      for scene, key in zip(scenes, keys)
+  ]
@@ -6,13 +6,20 @@ with human review and editing between each step.
 """
 
 import streamlit as st
+import streamlit.components.v1 as components
+import pandas as pd
 import base64
-import json
+import hashlib
+import logging
+import msgspec
+import threading
 import traceback
+from collections import OrderedDict
+from itertools import islice
 from google import genai
-from google_auth_oauthlib.flow import Flow
 from helpers.gemini_helpers import generate_voiceover_scenes, add_elevenlabs_tags
 from helpers.google_slides_helpers import get_slides_data_cached, slides_to_pdf
+from helpers.google_auth_helpers import get_google_oauth_flow
 
 
 # ============================================
@@ -28,35 +35,57 @@ st.set_page_config(
 st.title("🎙️ Voiceover Pipeline with Human-in-the-Loop")
 st.caption("Generate and refine educational voiceover scripts from PDF slides")
 
+logging.basicConfig(level=logging.INFO)
+
+# Number of slide expanders rendered per page in the slides editor
+SLIDES_PER_PAGE = 10
+# Presentations whose thumbnails are kept in the shared store at once
+THUMB_STORE_MAX_DECKS = 4
+
 
 # ============================================
 # Google OAuth Configuration
 # ============================================
 
-SCOPES = [
-    'https://www.googleapis.com/auth/presentations.readonly',
-    'https://www.googleapis.com/auth/drive.readonly'
-]
+# Sign-in button markup around the auth URL, so only one concatenation is needed
+_AUTH_BTN_PREFIX = '<a href="'
+_AUTH_BTN_SUFFIX = '" target="_self"><button style="background-color: #4285F4; color: white; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; font-size: 14px; width: 100%;">Log in with Google</button></a>'
 
 
-@st.cache_resource
-def get_google_oauth_flow():
-    """Create and return OAuth flow for Google authentication."""
-    client_config = json.loads(st.secrets["CLIENT_CONFIG"])
-    redirect_uri = st.secrets.get("REDIRECT_URI", "http://localhost:8501")
-    
-    return Flow.from_client_config(
-        client_config,
-        scopes=SCOPES,
-        redirect_uri=redirect_uri
-    )
+def get_oauth_url():
+    """Build the Google sign-in URL once per session instead of on every logged-out rerun.
+
+    Kept in session state rather than a shared cache so every visitor gets
+    their own state token, which never rotates out from under a sign-in in progress.
+    """
+    if '_google_auth_url' not in st.session_state:
+        flow = get_google_oauth_flow()
+        st.session_state['_google_auth_url'], _ = flow.authorization_url(prompt='consent')
+    return st.session_state['_google_auth_url']
+
+
+def sign_out():
+    """Forget the Google credentials; runs before the click's own rerun redraws the page."""
+    st.session_state.pop("creds", None)
+    # Generate a fresh sign-in URL for the next login
+    st.session_state.pop("_google_auth_url", None)
+
+
+def get_google_creds():
+    """Return the signed-in user's credentials, refreshing them if expired."""
+    creds = st.session_state.get("creds")
+    if creds is not None and creds.expired and creds.refresh_token:
+        # Only an expired token needs the google-auth transport, so load it here
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+    return creds
 
 
 # ============================================
 # Cached Resources (Singletons)
 # ============================================
 
-@st.cache_resource
+@st.cache_resource(max_entries=1)
 def get_gemini_client():
     """Initialize and cache the Gemini client."""
     api_key = st.secrets.get("GEMINI_API_KEY", None)
@@ -66,54 +95,219 @@ def get_gemini_client():
     return genai.Client(api_key=api_key)
 
 
+@st.cache_resource
+def _get_thumb_store():
+    """
+    Shared store of slide thumbnails, kept out of session state.
+    Holds the most recently loaded presentations, oldest first, with a lock
+    because every session's script thread writes to it.
+    """
+    return threading.Lock(), OrderedDict()
+
+
+def store_slide_thumbnails(presentation_id, thumbs):
+    """Save a presentation's thumbnails, evicting the least recently loaded decks."""
+    lock, store = _get_thumb_store()
+    with lock:
+        # Drop any previous copy first so a reload replaces it at the newest end
+        store.pop(presentation_id, None)
+        store[presentation_id] = thumbs
+        while len(store) > THUMB_STORE_MAX_DECKS:
+            store.popitem(last=False)
+
+
+def get_slide_thumbnails():
+    """
+    Return the loaded presentation's thumbnails keyed by thumb_key.
+    If other sessions have pushed the deck out of the shared store it is
+    fetched again (cheap, since get_slides_data_cached is cached per token);
+    returns None when that is not possible, e.g. after signing out.
+    """
+    presentation_id = st.session_state.get("slides_presentation_id")
+    if presentation_id is None:
+        return {}
+    _, store = _get_thumb_store()
+    thumbs = store.get(presentation_id)
+    if thumbs is None:
+        creds = get_google_creds()
+        if creds is None:
+            return None
+        try:
+            slides_data = get_slides_data_cached(presentation_id, creds)
+        except Exception:
+            logging.exception("Failed to re-fetch thumbnails for %s", presentation_id)
+            return None
+        if slides_data is None:
+            return None
+        thumbs = {slide["index"]: slide["png_base64"] for slide in slides_data}
+        store_slide_thumbnails(presentation_id, thumbs)
+    return thumbs
+
+
+def slides_with_thumbnails(slides):
+    """Re-attach thumbnails to slide metadata for PDF generation."""
+    thumbs = get_slide_thumbnails()
+    if thumbs is None:
+        # Never build a PDF without images for Gemini to read
+        raise RuntimeError("Slide thumbnails are no longer available. Please reload the presentation.")
+    return [{**slide, "png_base64": thumbs.get(slide["thumb_key"], "")} for slide in slides]
+
+
 
 
 # ============================================
 # Cached Data Processing
 # ============================================
 
-@st.cache_data
+def _hash_pdf_bytes(pdf_bytes):
+    """Cheap fixed-size digest used as the cache key for PDF bytes."""
+    return hashlib.blake2b(pdf_bytes, digest_size=16).digest()
+
+
+def session_pdf_key():
+    """
+    Digest of the session's PDF, computed once per bytes object.
+    The bytes are kept alongside the digest so an identity check is enough
+    to reuse it; a rerun with the same PDF no longer rehashes every byte.
+    """
+    pdf_bytes = st.session_state.pdf_bytes
+    cached = st.session_state.get('_pdf_key')
+    if cached is None or cached[0] is not pdf_bytes:
+        cached = (pdf_bytes, _hash_pdf_bytes(pdf_bytes))
+        st.session_state._pdf_key = cached
+    return cached[1]
+
+
 def process_pdf(pdf_bytes):
-    """Process and cache PDF data."""
-    pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
+    """Process PDF data; only called from the cached viewer builder."""
+    pdf_base64 = base64.b64encode(pdf_bytes).decode('ascii')
     return {
         'base64': pdf_base64,
         'size': len(pdf_bytes)
     }
 
 
+# Viewer markup around the base64 payload, so only one concatenation is needed
+_PDF_VIEWER_PREFIX = """
+<iframe id="pdf-frame" width="100%" height="600" style="border: none;"></iframe>
+<script>
+    const bytes = Uint8Array.from(atob('"""
+_PDF_VIEWER_SUFFIX = """'), c => c.charCodeAt(0));
+    const url = URL.createObjectURL(new Blob([bytes], {type: "application/pdf"}));
+    document.getElementById("pdf-frame").src = url;
+</script>
+"""
+
+
+@st.cache_data(max_entries=4, ttl=3600)
+def pdf_viewer_html(pdf_key, _pdf_bytes):
+    """
+    Build and cache a viewer that loads the PDF through a blob object URL.
+    Keyed on pdf_key (see session_pdf_key); the underscore keeps the bytes out of the hash.
+    """
+    return _PDF_VIEWER_PREFIX + process_pdf(_pdf_bytes)['base64'] + _PDF_VIEWER_SUFFIX
+
+
+def _slides_digest(slides):
+    """Digest of the slide fields that affect the generated PDF."""
+    h = hashlib.blake2b(digest_size=16)
+    for slide in slides:
+        h.update(f"{slide['index']}|".encode())
+        h.update(slide.get('notes', '').encode())
+        h.update(slide.get('png_base64', '').encode())
+    return h.digest()
+
+
+@st.cache_data(max_entries=4, ttl=3600, hash_funcs={list: _slides_digest})
+def cached_slides_to_pdf(slides):
+    """Generate and cache the PDF for the current slides."""
+    return slides_to_pdf(slides)
+
+
+def scenes_key(scenes):
+    """Hashable (comment, speech, elevenlabs) tuples for the export cache."""
+    return tuple(
+        (s.get('comment', ''), s.get('speech', ''), s.get('elevenlabs', ''))
+        for s in scenes
+    )
+
+
+@st.cache_data(max_entries=4, ttl=3600)
+def export_json(scenes_tuple):
+    """Serialize and cache the JSON export for the refined scenes."""
+    scenes = [
+        {'comment': comment, 'speech': speech, 'elevenlabs': elevenlabs}
+        for comment, speech, elevenlabs in scenes_tuple
+    ]
+    # msgspec emits UTF-8 bytes directly, which st.download_button accepts as-is
+    return msgspec.json.format(msgspec.json.encode({
+        'scenes': scenes,
+        'metadata': {
+            'total_scenes': len(scenes)
+        }
+    }), indent=2)
+
+
+@st.cache_data(max_entries=4, ttl=3600)
+def export_script_text(scenes_tuple):
+    """Build and cache the plain-text script export for the refined scenes."""
+    return "\n\n".join([
+        f"Scene {i+1}: {comment}\n{elevenlabs}"
+        for i, (comment, _, elevenlabs) in enumerate(scenes_tuple)
+    ])
+
+
+def count_elevenlabs_chars(scenes):
+    """Total characters across the ElevenLabs text of all scenes."""
+    return sum(len(s.get('elevenlabs', '')) for s in scenes)
+
+
 # ============================================
 # Session State Initialization
 # ============================================
 
-def initialize_session_state():
-    """Initialize all session state keys with defaults."""
-    if 'workflow_state' not in st.session_state:
-        st.session_state.workflow_state = 'slides_import'  # Start with slides import
-    
-    if 'is_processing' not in st.session_state:
-        st.session_state.is_processing = False
-    
+# Default value for every session state key the workflow relies on
+SESSION_DEFAULTS = {
+    'workflow_state': 'slides_import',  # Start with slides import
+    'is_processing': False,
     # Google Slides state
-    if 'slides_data' not in st.session_state:
-        st.session_state.slides_data = None
+    'slides_data': None,
+}
+
+# Set once defaults are applied; reset paths delete it so defaults are re-applied
+SESSION_INITIALIZED_KEY = '_session_initialized'
+
+
+def initialize_session_state():
+    """Initialize all session state keys with defaults, once per session."""
+    if st.session_state.get(SESSION_INITIALIZED_KEY):
+        return
+    for key, value in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(key, value)
+    st.session_state[SESSION_INITIALIZED_KEY] = True
 
 
 # ==============================
 # Handle Google OAuth Callback
 # ==============================
 # Check if we are returning from Google Auth
-if "code" in st.query_params and "creds" not in st.session_state:
+# Signed-in sessions skip the query-params lookup entirely, and each code is
+# exchanged at most once, so a failed code left in the URL is not retried
+if (
+    "creds" not in st.session_state
+    and (auth_code := st.query_params.get("code"))
+    and auth_code != st.session_state.get("_oauth_code_consumed")
+):
+    st.session_state["_oauth_code_consumed"] = auth_code
     try:
         flow = get_google_oauth_flow()
-        flow.fetch_token(code=st.query_params["code"])
+        flow.fetch_token(code=auth_code)
         st.session_state.creds = flow.credentials
         # Clean the URL by removing the code
         st.query_params.clear()
         st.rerun()
     except Exception as e:
         st.error(f"Authentication error: {e}")
-        st.query_params.clear()
 
 initialize_session_state()
 
@@ -122,31 +316,56 @@ initialize_session_state()
 # Workflow State Machine
 # ============================================
 
-WORKFLOW_STATES = {
-    'slides_import': {'next': 'upload', 'display': '📊 Import Slides', 'step': 0},
-    'upload': {'next': 'generate_voiceover', 'display': '📤 Upload /PDF', 'step': 1},
-    'generate_voiceover': {'next': 'add_audio_tags', 'display': '🎬 Generate & Review Script', 'step': 2},
-    'add_audio_tags': {'next': 'export', 'display': '🎨 Add Audio Tags & Review', 'step': 3},
-    'export': {'next': 'debug', 'display': '📥 Export', 'step': 4},
-    'debug': {'next': None, 'display': '🔧 Debug', 'step': 5}
+# (state_key, step, next, display) for each step, in order
+WORKFLOW_STATES = (
+    ('slides_import', 0, 'upload', '📊 Import Slides'),
+    ('upload', 1, 'generate_voiceover', '📤 Upload /PDF'),
+    ('generate_voiceover', 2, 'add_audio_tags', '🎬 Generate & Review Script'),
+    ('add_audio_tags', 3, 'export', '🎨 Add Audio Tags & Review'),
+    ('export', 4, 'debug', '📥 Export'),
+    ('debug', 5, None, '🔧 Debug'),
+)
+
+# Flat per-field lookups, computed once so each rerun does a single dict hit
+LAST_STEP = len(WORKFLOW_STATES) - 1
+STEP_NUMBERS = {key: step for key, step, _, _ in WORKFLOW_STATES}
+NEXT_STATES = {key: next_key for key, _, next_key, _ in WORKFLOW_STATES}
+STEP_PROGRESS = {key: step / LAST_STEP for key, step, _, _ in WORKFLOW_STATES}
+
+# Sidebar navigation options and their labels
+NAV_KEYS = tuple(key for key, _, _, _ in WORKFLOW_STATES)
+NAV_LABELS = {key: display for key, _, _, display in WORKFLOW_STATES}
+
+# Session state keys holding per-project data, cleared on reset
+WORKFLOW_DATA_KEYS = {
+    'slides_data', 'pdf_bytes', 'scenes', 'refined_scenes', '_total_chars', '_pdf_key',
+    'voiceover_approved', 'final_approved', SESSION_INITIALIZED_KEY
 }
 
+# Most items rendered when inspecting a list or dict on the debug step
+DEBUG_JSON_LIMIT = 50
+
+
+def go_to_step(target):
+    """Switch to target step, rerunning only when the step actually changes."""
+    if st.session_state.workflow_state != target:
+        st.session_state.workflow_state = target
+        st.rerun()
+
 
 def advance_workflow():
     """Move to next step in workflow."""
-    current = st.session_state.workflow_state
-    next_state = WORKFLOW_STATES[current]['next']
+    next_state = NEXT_STATES[st.session_state.workflow_state]
     if next_state:
-        st.session_state.workflow_state = next_state
+        go_to_step(next_state)
 
 
 def reset_workflow():
     """Reset to beginning."""
     st.session_state.workflow_state = 'slides_import'  # Start from slides import
     # Clear relevant session state
-    for key in ['slides_data', 'pdf_base64', 'scenes', 'refined_scenes', 'voiceover_approved', 'final_approved']:
-        if key in st.session_state:
-            del st.session_state[key]
+    for key in WORKFLOW_DATA_KEYS & set(st.session_state.keys()):
+        del st.session_state[key]
 
 
 # ============================================
@@ -174,20 +393,17 @@ with st.sidebar:
     if "creds" not in st.session_state:
         st.info("Not authenticated with Google")
         try:
-            flow = get_google_oauth_flow()
-            auth_url, _ = flow.authorization_url(prompt='consent')
+            auth_url = get_oauth_url()
             
             # Custom HTML button to open in the same tab
-            auth_link = f'<a href="{auth_url}" target="_self"><button style="background-color: #4285F4; color: white; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; font-size: 14px; width: 100%;">Log in with Google</button></a>'
+            auth_link = _AUTH_BTN_PREFIX + auth_url + _AUTH_BTN_SUFFIX
             st.markdown(auth_link, unsafe_allow_html=True)
             st.caption("Required for Google Slides import")
         except Exception as e:
             st.error(f"Error setting up Google authentication: {e}")
     else:
         st.success("✅ Authenticated with Google")
-        if st.button("Sign out of Google", width="stretch"):
-            del st.session_state.creds
-            st.rerun()
+        st.button("Sign out of Google", width="stretch", on_click=sign_out)
     
     st.divider()
     
@@ -196,44 +412,23 @@ with st.sidebar:
     
     # Show current step
     current_step = st.session_state.workflow_state
-    current_info = WORKFLOW_STATES[current_step]
-    total_steps = len(WORKFLOW_STATES)
     
-    # Adjust progress for step 0
-    if current_info['step'] == 0:
-        progress_value = 0.0
-    else:
-        progress_value = current_info['step'] / (total_steps - 1)
-    
-    st.progress(progress_value)
-    st.caption(f"**Step {current_info['step']}/{total_steps - 1}:** {current_info['display']}")
-    
-    # Quick navigation buttons
-    st.markdown("**Jump to Step:**")
-    
-    # Create a grid layout for navigation buttons
-    nav_cols = st.columns(1)
-    for i, (state_key, state_info) in enumerate(WORKFLOW_STATES.items()):
-        col_index = i % 1  # Single column
-        with nav_cols[col_index]:
-            # Highlight current step
-            button_type = "primary" if state_key == current_step else "secondary"
-            is_current = state_key == current_step
-            
-            # Create button label with emoji and step number
-            button_label = f"{state_info['display']}"
-            if is_current:
-                button_label = f"➤ {button_label}"
-            
-            if st.button(
-                button_label,
-                key=f"nav_{state_key}",
-                type=button_type,
-                width="stretch",
-                disabled=is_current
-            ):
-                st.session_state.workflow_state = state_key
-                st.rerun()
+    st.progress(STEP_PROGRESS[current_step])
+    st.caption(f"**Step {STEP_NUMBERS[current_step]}/{LAST_STEP}:** {NAV_LABELS[current_step]}")
+    
+    # Quick navigation - one radio widget bound to the workflow state
+    def jump_to_step():
+        """Move the workflow to the step picked in the sidebar."""
+        st.session_state.workflow_state = st.session_state.nav_radio
+    
+    st.session_state.nav_radio = current_step
+    st.radio(
+        "**Jump to Step:**",
+        NAV_KEYS,
+        format_func=NAV_LABELS.__getitem__,
+        key="nav_radio",
+        on_change=jump_to_step
+    )
     
     st.divider()
     
@@ -259,10 +454,13 @@ with st.sidebar:
             st.rerun()
         
         if st.button("Reset All Session State"):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
+            st.session_state.clear()
             st.success("Session reset!")
             st.rerun()
+    
+    # Warm the cached Gemini client before the user clicks Generate
+    if st.secrets.get("GEMINI_API_KEY"):
+        get_gemini_client()
 
 
 # ============================================
@@ -280,7 +478,6 @@ if st.session_state.workflow_state == 'slides_import':
         with col2:
             if st.button("⏭️ Skip to Upload PDF", type="secondary", width="stretch"):
                 advance_workflow()
-                st.rerun()
     else:
         # Slide Presentation ID Input
         presentation_id = st.text_input(
@@ -295,7 +492,6 @@ if st.session_state.workflow_state == 'slides_import':
         with col2:
             if st.button("⏭️ Skip", width="stretch"):
                 advance_workflow()
-                st.rerun()
         
         if load_slides_btn:
             if not presentation_id:
@@ -304,11 +500,18 @@ if st.session_state.workflow_state == 'slides_import':
                 with st.spinner("Loading slides data..."):
                     try:
                         # Load slides using cached function
-                        slides_data = get_slides_data_cached(presentation_id, st.session_state.creds)
+                        slides_data = get_slides_data_cached(presentation_id, get_google_creds())
                         
                         if slides_data is None:
                             st.error("Failed to load slides data. Please check the Presentation ID and permissions.")
                         else:
+                            # Keep only small metadata in session state
+                            thumbs = {}
+                            for slide in slides_data:
+                                slide["thumb_key"] = slide["index"]
+                                thumbs[slide["index"]] = slide.pop("png_base64")
+                            store_slide_thumbnails(presentation_id, thumbs)
+                            st.session_state.slides_presentation_id = presentation_id
                             st.session_state.slides_data = slides_data
                             st.success(f"✅ Successfully loaded {len(slides_data)} slides!")
                             st.rerun()
@@ -316,59 +519,80 @@ if st.session_state.workflow_state == 'slides_import':
                         st.error(f"Error loading slides: {e}")
         
         # Display and edit slides if data is available
-        if st.session_state.slides_data:
+        slides_data = st.session_state.slides_data
+        if slides_data:
             st.divider()
-            st.subheader(f"📝 Edit Slides ({len(st.session_state.slides_data)} slides)")
+            st.subheader(f"📝 Edit Slides ({len(slides_data)} slides)")
             
             # Define callback to remove a slide
             def remove_slide(slide_index):
                 """Remove a slide from slides_data and re-index."""
-                st.session_state.slides_data = [
-                    slide for slide in st.session_state.slides_data
-                    if slide["index"] != slide_index
-                ]
-                # Re-index remaining slides
-                for i, slide in enumerate(st.session_state.slides_data):
-                    slide["index"] = i
+                slides = st.session_state.slides_data
+                pos = next(i for i, slide in enumerate(slides) if slide["index"] == slide_index)
+                del slides[pos]
+                # Re-index only the slides after the removed one
+                for i in range(pos, len(slides)):
+                    slides[i]["index"] = i
+            
+            # Only render one page of slides at a time
+            num_slides = len(slides_data)
+            num_pages = max(1, (num_slides + SLIDES_PER_PAGE - 1) // SLIDES_PER_PAGE)
+            # Clamp the stored page in case slides were removed
+            if st.session_state.get("slide_page", 1) > num_pages:
+                st.session_state.slide_page = num_pages
+            page = st.number_input("Page", min_value=1, max_value=num_pages, key="slide_page")
+            visible_slides = slides_data[(page - 1) * SLIDES_PER_PAGE:page * SLIDES_PER_PAGE]
+            st.caption(f"Page {page} of {num_pages}")
             
-            # Display each slide in an expander
-            for slide in st.session_state.slides_data:
-                slide_index = slide["index"]
+            # Batch notes edits into a single submit
+            with st.form("slides_edit_form", clear_on_submit=False):
+                new_notes_map = {}
+                thumbs = get_slide_thumbnails()
+                if thumbs is None:
+                    st.warning("⚠️ Slide thumbnails are no longer available. Please reload the presentation.")
+                    thumbs = {}
                 
-                with st.expander(f"Slide {slide_index + 1}", expanded=False):
-                    col1, col2, col3 = st.columns([2, 3, 1])
+                # Display each visible slide in an expander
+                for slide in visible_slides:
+                    slide_index = slide["index"]
                     
-                    with col1:
-                        # Display slide thumbnail
-                        if slide.get("png_base64"):
-                            try:
-                                image_html = f"<img src='{slide['png_base64']}' style='width:100%; height:auto;' />"
-                                st.markdown(image_html, unsafe_allow_html=True)
-                            except Exception as e:
-                                st.warning(f"Could not display thumbnail: {e}")
+                    thumb = thumbs.get(slide["thumb_key"])
                     
-                    with col2:
-                        # Edit speaker notes
-                        st.markdown("**Speaker Notes:**")
-                        new_notes = st.text_area(
-                            "Edit notes:",
-                            value=slide.get("notes", ""),
-                            height=150,
-                            key=f"notes_{slide_index}",
-                            label_visibility="collapsed"
-                        )
-                        # Update notes in session state if changed
-                        if new_notes != slide.get("notes", ""):
-                            st.session_state.slides_data[slide_index]["notes"] = new_notes
-                    
-                    with col3:
-                        st.button(
-                            "🗑️ Remove",
-                            key=f"remove_{slide_index}",
-                            on_click=remove_slide,
-                            args=(slide_index,),
-                            width="stretch"
-                        )
+                    with st.expander(f"Slide {slide_index + 1}", expanded=False):
+                        col1, col2, col3 = st.columns([2, 3, 1])
+                        
+                        with col1:
+                            # Display slide thumbnail
+                            if thumb:
+                                try:
+                                    st.image(base64.b64decode(thumb), width="stretch")
+                                except Exception as e:
+                                    st.warning(f"Could not display thumbnail: {e}")
+                        
+                        with col2:
+                            # Edit speaker notes
+                            st.markdown("**Speaker Notes:**")
+                            new_notes_map[slide_index] = st.text_area(
+                                "Edit notes:",
+                                value=slide.get("notes", ""),
+                                height=150,
+                                key=f"notes_{slide_index}",
+                                label_visibility="collapsed"
+                            )
+                        
+                        with col3:
+                            st.form_submit_button(
+                                "🗑️ Remove",
+                                key=f"remove_{slide_index}",
+                                on_click=remove_slide,
+                                args=(slide_index,),
+                                width="stretch"
+                            )
+                
+                if st.form_submit_button("💾 Save Notes", width="stretch"):
+                    for slide in slides_data:
+                        slide["notes"] = new_notes_map.get(slide["index"], slide.get("notes", ""))
+                    st.toast("✅ Notes saved!", icon="💾")
             
             # Generate PDF from slides
             st.divider()
@@ -380,8 +604,8 @@ if st.session_state.workflow_state == 'slides_import':
                     with st.spinner("Generating PDF..."):
                         try:
                             # Generate PDF from slides
-                            pdf_base64 = slides_to_pdf(st.session_state.slides_data)
-                            st.session_state.pdf_base64 = pdf_base64
+                            pdf_base64 = cached_slides_to_pdf(slides_with_thumbnails(slides_data))
+                            st.session_state.pdf_bytes = base64.b64decode(pdf_base64)
                             st.success("✅ PDF generated successfully!")
                             st.rerun()
                         except Exception as e:
@@ -390,27 +614,20 @@ if st.session_state.workflow_state == 'slides_import':
                                 st.code(traceback.format_exc())
             
             with col2:
-                if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+                if st.session_state.get("pdf_bytes"):
                     if st.button("▶️ Continue", width="stretch"):
                         advance_workflow()
-                        st.rerun()
             
-            # Display PDF preview if available
-            if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+            # Offer the PDF for download; the preview is shown on the upload step
+            if st.session_state.get("pdf_bytes"):
                 st.divider()
-                st.subheader("📄 PDF Preview")
-                
-                # Decode base64 to bytes for display
-                pdf_bytes = base64.b64decode(st.session_state.pdf_base64)
-                
-                # Display PDF using iframe
-                pdf_display = f'<iframe src="data:application/pdf;base64,{st.session_state.pdf_base64}" width="100%" height="600px" type="application/pdf"></iframe>'
-                st.markdown(pdf_display, unsafe_allow_html=True)
+                st.subheader("📄 PDF Ready")
+                st.caption("Continue to preview the generated PDF.")
                 
                 # Download button
                 st.download_button(
                     label="📥 Download PDF",
-                    data=pdf_bytes,
+                    data=st.session_state.pdf_bytes,
                     file_name="slides_presentation.pdf",
                     mime="application/pdf",
                     width="stretch"
@@ -425,20 +642,18 @@ elif st.session_state.workflow_state == 'upload':
     st.header("Step 1: Upload PDF Slide Deck")
     st.info("💡 Upload a PDF containing your educational slides. The AI will analyze each slide and generate voiceover scripts.")
     
-    if "pdf_base64" in st.session_state and st.session_state.pdf_base64:
+    if st.session_state.get("pdf_bytes"):
         st.success("✅ PDF already uploaded.")
         
         col1, col2 = st.columns([3, 1])
         with col1:
             st.caption("📄 Uploaded PDF Preview:")
-            # Display PDF using iframe
-            pdf_display = f'<iframe src="data:application/pdf;base64,{st.session_state.pdf_base64}" width="100%" height="600px" type="application/pdf"></iframe>'
-            st.markdown(pdf_display, unsafe_allow_html=True)
+            # Display PDF through a blob URL inside a component iframe
+            components.html(pdf_viewer_html(session_pdf_key(), st.session_state.pdf_bytes), height=620)
         
         with col2:
             if st.button("▶️ Continue", width="stretch"):
                 advance_workflow()
-                st.rerun()
     else:
         uploaded_file = st.file_uploader(
             "Choose a PDF file",
@@ -447,18 +662,16 @@ elif st.session_state.workflow_state == 'upload':
         )
         
         if uploaded_file:
-            pdf_data = process_pdf(uploaded_file.read())
-            st.session_state.pdf_base64 = pdf_data['base64']
+            st.session_state.pdf_bytes = uploaded_file.read()
             
             col1, col2, col3 = st.columns([2, 2, 1])
             with col1:
                 st.success(f"✅ **Uploaded:** {uploaded_file.name}")
             with col2:
-                st.caption(f"📦 **Size:** {pdf_data['size']:,} bytes")
+                st.caption(f"📦 **Size:** {len(st.session_state.pdf_bytes):,} bytes")
             with col3:
                 if st.button("▶️ Next", width="stretch"):
                     advance_workflow()
-                    st.rerun()
         else:
             st.warning("📤 Please upload a PDF file to continue")
 
@@ -471,7 +684,7 @@ elif st.session_state.workflow_state == 'generate_voiceover':
     st.header("Step 2: Generate Voiceover Script")
     st.info("💡 The AI will analyze your PDF slides and generate a voiceover script for each slide.")
     
-    if 'pdf_base64' not in st.session_state:
+    if 'pdf_bytes' not in st.session_state:
         st.error("❌ No PDF found. Please go back and upload a PDF.")
     else:
         if st.button(
@@ -492,7 +705,7 @@ elif st.session_state.workflow_state == 'generate_voiceover':
                     # Direct API call - no agent, no runner, no async complexity
                     scenes = generate_voiceover_scenes(
                         gemini_client=gemini_client,
-                        pdf_base64=st.session_state.pdf_base64
+                        pdf_bytes=st.session_state.pdf_bytes
                     )
                     
                     # Store in session state
@@ -522,70 +735,78 @@ elif st.session_state.workflow_state == 'generate_voiceover':
     if 'scenes' in st.session_state and st.session_state.scenes:
         st.info(f"💡 Review and edit the {len(st.session_state.scenes)} generated scenes. Make any changes you'd like before continuing.")
         
-        # Editable scenes
-        edited_scenes = []
-        for i, scene in enumerate(st.session_state.scenes):
-            with st.expander(
-                f"🎬 Scene {i+1}: {scene.get('comment', '')[:60]}...",
-                expanded=True
-            ):
-                col1, col2 = st.columns([1, 3])
-                
-                with col1:
-                    st.caption("**Scene Description**")
-                    edited_comment = st.text_area(
-                        "Comment",
-                        value=scene.get('comment', ''),
-                        key=f"comment_{i}",
-                        height=80,
-                        label_visibility="collapsed",
-                        help="Brief description of this scene"
-                    )
-                
-                with col2:
-                    st.caption("**Voiceover Text**")
-                    edited_speech = st.text_area(
-                        "Speech",
-                        value=scene.get('speech', ''),
-                        key=f"speech_{i}",
-                        height=120,
-                        label_visibility="collapsed",
-                        help="Edit the voiceover script"
-                    )
-                
-                st.caption(f"📏 {len(edited_speech)} characters")
-                
-                edited_scenes.append({
-                    'comment': edited_comment,
-                    'speech': edited_speech
-                })
+        # Editable scenes, submitted together as one batch
+        with st.form("scenes_edit_form", clear_on_submit=False):
+            edited_scenes = []
+            for i, scene in enumerate(st.session_state.scenes):
+                with st.expander(
+                    f"🎬 Scene {i+1}: {scene.get('comment', '')[:60]}...",
+                    expanded=True
+                ):
+                    col1, col2 = st.columns([1, 3])
+                    
+                    with col1:
+                        st.caption("**Scene Description**")
+                        edited_comment = st.text_area(
+                            "Comment",
+                            value=scene.get('comment', ''),
+                            key=f"comment_{i}",
+                            height=80,
+                            label_visibility="collapsed",
+                            help="Brief description of this scene"
+                        )
+                    
+                    with col2:
+                        st.caption("**Voiceover Text**")
+                        edited_speech = st.text_area(
+                            "Speech",
+                            value=scene.get('speech', ''),
+                            key=f"speech_{i}",
+                            height=120,
+                            label_visibility="collapsed",
+                            help="Edit the voiceover script"
+                        )
+                    
+                    st.caption(f"📏 {len(edited_speech)} characters")
+                    
+                    edited_scenes.append({
+                        'comment': edited_comment,
+                        'speech': edited_speech
+                    })
+            
+            # Continue is a submit button too, so unsaved edits are never left behind
+            col2, col3, col4 = st.columns([2, 2, 1])
+            
+            with col2:
+                save_edits = st.form_submit_button("💾 Save Edits", width="stretch")
+            
+            with col3:
+                voiceover_approved = st.checkbox(
+                    "✓ Approve & Continue",
+                    help="Check to approve and proceed to audio tag generation"
+                )
+            
+            with col4:
+                save_and_continue = st.form_submit_button(
+                    "▶️",
+                    width="stretch",
+                    type="primary",
+                    help="Save edits and continue"
+                )
+            
+            if save_edits or save_and_continue:
+                st.session_state.scenes = edited_scenes
+                if not save_and_continue:
+                    st.toast("✅ Edits saved!", icon="💾")
+                elif voiceover_approved:
+                    advance_workflow()
+                else:
+                    st.warning("⚠️ Edits saved. Check \"Approve & Continue\" to proceed.")
         
         # Action buttons
         st.divider()
-        col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
-        
-        with col1:
-            if st.button("💾 Save Edits", width="stretch"):
-                st.session_state.scenes = edited_scenes
-                st.success("✅ Edits saved!")
-        
-        with col2:
-            if st.button("🔄 Regenerate Script", width="stretch"):
-                st.session_state.workflow_state = 'generate_voiceover'
-                st.rerun()
-        
-        with col3:
-            voiceover_approved = st.checkbox(
-                "✓ Approve & Continue",
-                help="Check to approve and proceed to audio tag generation"
-            )
-        
-        with col4:
-            if st.button("▶️", disabled=not voiceover_approved, width="stretch", type="primary"):
-                # Save final edits before continuing
-                st.session_state.scenes = edited_scenes
-                advance_workflow()
-                st.rerun()
+        if st.button("🔄 Regenerate Script", width="stretch"):
+            go_to_step('generate_voiceover')
 
 
 # ============================================
@@ -618,6 +839,9 @@ elif st.session_state.workflow_state == 'add_audio_tags':
                     )
                     
                     st.session_state.refined_scenes = refined_scenes
+                    st.session_state._total_chars = count_elevenlabs_chars(refined_scenes)
+                    # Drop pending table edits so they aren't applied to the new scenes
+                    st.session_state.pop("refined_editor", None)
                     
                     st.write(f"✅ Enhanced {len(refined_scenes)} scenes!")
                     status.update(label="✅ Audio tags complete!", state="complete")
@@ -642,71 +866,68 @@ elif st.session_state.workflow_state == 'add_audio_tags':
     if 'refined_scenes' in st.session_state and st.session_state.refined_scenes:
         st.info(f"💡 Review the final scripts with audio tags. You can edit the tags before exporting.")
         
-        # Editable refined scenes
-        edited_refined = []
-        for i, scene in enumerate(st.session_state.refined_scenes):
-            with st.expander(
-                f"🎬 Scene {i+1}: {scene.get('comment', '')[:60]}...",
-                expanded=True
-            ):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.caption("**Original Speech**")
-                    st.text_area(
-                        "Original",
-                        value=scene.get('speech', ''),
-                        key=f"orig_{i}",
-                        height=100,
-                        disabled=True,
-                        label_visibility="collapsed"
-                    )
-                
-                with col2:
-                    st.caption("**With Audio Tags**")
-                    edited_elevenlabs = st.text_area(
-                        "ElevenLabs",
-                        value=scene.get('elevenlabs', ''),
-                        key=f"elevenlabs_{i}",
-                        height=120,
-                        label_visibility="collapsed",
+        # Editable refined scenes in one table, submitted together as one batch;
+        # character counts are a computed column instead of a caption per scene
+        refined_df = pd.DataFrame(
+            st.session_state.refined_scenes,
+            columns=['comment', 'speech', 'elevenlabs']
+        )
+        refined_df['chars'] = refined_df['elevenlabs'].str.len()
+        
+        with st.form("refined_edit_form", clear_on_submit=False):
+            edited_df = st.data_editor(
+                refined_df,
+                disabled=['comment', 'speech', 'chars'],
+                column_config={
+                    'comment': st.column_config.TextColumn("Scene", width="small"),
+                    'speech': st.column_config.TextColumn("Original Speech", width="medium"),
+                    'elevenlabs': st.column_config.TextColumn(
+                        "With Audio Tags",
+                        width="large",
                         help="Edit audio tags and text"
-                    )
-                
-                st.caption(f"📏 Enhanced version: {len(edited_elevenlabs)} characters")
-                
-                edited_refined.append({
-                    'comment': scene.get('comment', ''),
-                    'speech': scene.get('speech', ''),
-                    'elevenlabs': edited_elevenlabs
-                })
+                    ),
+                    'chars': st.column_config.NumberColumn("📏", width="small"),
+                },
+                num_rows="fixed",
+                width="stretch",
+                key="refined_editor"
+            )
+            edited_refined = edited_df.drop(columns='chars').to_dict('records')
+            
+            # Continue is a submit button too, so unsaved edits are never left behind
+            col2, col3, col4 = st.columns([2, 2, 1])
+            
+            with col2:
+                save_edits = st.form_submit_button("💾 Save Final Edits", width="stretch")
+            
+            with col3:
+                final_approved = st.checkbox(
+                    "✓ Final Approval",
+                    help="Check to approve and enable export"
+                )
+            
+            with col4:
+                save_and_continue = st.form_submit_button(
+                    "▶️",
+                    width="stretch",
+                    type="primary",
+                    help="Save edits and continue to export"
+                )
+            
+            if save_edits or save_and_continue:
+                st.session_state.refined_scenes = edited_refined
+                st.session_state._total_chars = count_elevenlabs_chars(edited_refined)
+                if not save_and_continue:
+                    st.toast("✅ Final edits saved!", icon="💾")
+                elif final_approved:
+                    advance_workflow()
+                else:
+                    st.warning("⚠️ Edits saved. Check \"Final Approval\" to export.")
         
         # Action buttons
         st.divider()
-        col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
-        
-        with col1:
-            if st.button("💾 Save Final Edits", width="stretch"):
-                st.session_state.refined_scenes = edited_refined
-                st.success("✅ Final edits saved!")
-        
-        with col2:
-            if st.button("🔄 Regenerate Tags", width="stretch"):
-                st.session_state.workflow_state = 'add_audio_tags'
-                st.rerun()
-        
-        with col3:
-            final_approved = st.checkbox(
-                "✓ Final Approval",
-                help="Check to approve and enable export"
-            )
-        
-        with col4:
-            if st.button("▶️", disabled=not final_approved, width="stretch", type="primary"):
-                # Save before export
-                st.session_state.refined_scenes = edited_refined
-                advance_workflow()
-                st.rerun()
+        if st.button("🔄 Regenerate Tags", width="stretch"):
+            go_to_step('add_audio_tags')
 
 
 # ============================================
@@ -723,7 +944,9 @@ elif st.session_state.workflow_state == 'export':
         with col1:
             st.metric("Total Scenes", len(st.session_state.refined_scenes))
         with col2:
-            total_chars = sum(len(s.get('elevenlabs', '')) for s in st.session_state.refined_scenes)
+            if '_total_chars' not in st.session_state:
+                st.session_state._total_chars = count_elevenlabs_chars(st.session_state.refined_scenes)
+            total_chars = st.session_state._total_chars
             st.metric("Total Characters", f"{total_chars:,}")
         with col3:
             avg_chars = total_chars // len(st.session_state.refined_scenes) if st.session_state.refined_scenes else 0
@@ -735,19 +958,13 @@ elif st.session_state.workflow_state == 'export':
         st.subheader("📥 Download Options")
         
         col1, col2 = st.columns(2)
+        refined_key = scenes_key(st.session_state.refined_scenes)
         
         with col1:
             # JSON export
-            output_json = {
-                'scenes': st.session_state.refined_scenes,
-                'metadata': {
-                    'total_scenes': len(st.session_state.refined_scenes)
-                }
-            }
-            
             st.download_button(
                 label="📄 Download JSON",
-                data=json.dumps(output_json, indent=2),
+                data=export_json(refined_key),
                 file_name="voiceover_scenes.json",
                 mime="application/json",
                 width="stretch"
@@ -755,14 +972,9 @@ elif st.session_state.workflow_state == 'export':
         
         with col2:
             # Text export (script only)
-            script_text = "\n\n".join([
-                f"Scene {i+1}: {scene.get('comment', '')}\n{scene.get('elevenlabs', '')}"
-                for i, scene in enumerate(st.session_state.refined_scenes)
-            ])
-            
             st.download_button(
                 label="📝 Download Script (TXT)",
-                data=script_text,
+                data=export_script_text(refined_key),
                 file_name="voiceover_script.txt",
                 mime="text/plain",
                 width="stretch"
@@ -796,48 +1008,31 @@ elif st.session_state.workflow_state == 'debug':
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Session State Keys", len(st.session_state.keys()))
+        st.metric("Session State Keys", len(st.session_state))
     
     with col2:
-        workflow_step = WORKFLOW_STATES[st.session_state.workflow_state]['step']
-        st.metric("Current Workflow Step", f"{workflow_step}/{len(WORKFLOW_STATES) - 1}")
+        workflow_step = STEP_NUMBERS[st.session_state.workflow_state]
+        st.metric("Current Workflow Step", f"{workflow_step}/{LAST_STEP}")
     
     with col3:
-        has_pdf = "✅" if "pdf_base64" in st.session_state and st.session_state.pdf_base64 else "❌"
+        has_pdf = "✅" if st.session_state.get("pdf_bytes") else "❌"
         st.metric("PDF Loaded", has_pdf)
     
     st.divider()
     
-    # Display full session state
+    # Summarize session state as one (key, type, size) row per key; values
+    # are only serialized when inspected individually below
     st.subheader("🔍 Full Session State")
     
-    # Create a JSON-serializable version of session state
-    session_state_dict = {}
-    for key in st.session_state.keys():
-        value = st.session_state[key]
-        
-        # Handle non-serializable objects
-        if key in ['session_service', 'adk_session', 'creds']:
-            session_state_dict[key] = f"<{type(value).__name__} object>"
-        elif key == 'pdf_base64' and value:
-            # Truncate base64 data for display
-            session_state_dict[key] = f"<base64 data, {len(value)} chars>"
-        elif key == 'slides_data' and value:
-            # Show summary of slides data
-            session_state_dict[key] = {
-                "type": "list of slides",
-                "count": len(value),
-                "sample": value[0] if value else None
-            }
-        elif isinstance(value, (str, int, float, bool, type(None))):
-            session_state_dict[key] = value
-        elif isinstance(value, (list, dict)):
-            session_state_dict[key] = value
-        else:
-            session_state_dict[key] = f"<{type(value).__name__}>"
-    
-    # Use st.json for pretty display
-    st.json(session_state_dict)
+    summary_rows = [
+        {
+            'key': key,
+            'type': type(value).__name__,
+            'size': len(value) if hasattr(value, '__len__') else None,
+        }
+        for key, value in st.session_state.items()
+    ]
+    st.dataframe(summary_rows, width="stretch", hide_index=True)
     
     st.divider()
     
@@ -870,12 +1065,18 @@ elif st.session_state.workflow_state == 'debug':
             if isinstance(value, (str, int, float, bool, type(None))):
                 st.write("**Value:**")
                 st.code(str(value))
-            elif isinstance(value, dict):
-                st.write("**Value (JSON):**")
-                st.json(value)
-            elif isinstance(value, list):
-                st.write(f"**Value (List with {len(value)} items):**")
-                st.json(value)
+            elif isinstance(value, bytes):
+                st.write(f"**Value:** {len(value):,} bytes")
+            elif isinstance(value, (dict, list)):
+                st.write(f"**Value ({type(value).__name__} with {len(value)} items):**")
+                # Serialize only on request, and at most DEBUG_JSON_LIMIT items
+                if st.checkbox("Show raw JSON", value=False, key=f"debug_raw_{selected_key}"):
+                    if isinstance(value, dict):
+                        st.json(dict(islice(value.items(), DEBUG_JSON_LIMIT)))
+                    else:
+                        st.json(list(islice(value, DEBUG_JSON_LIMIT)))
+                    if len(value) > DEBUG_JSON_LIMIT:
+                        st.caption(f"Showing the first {DEBUG_JSON_LIMIT} of {len(value)} items.")
             else:
                 st.write("**Value:**")
                 st.write(value)
@@ -891,8 +1092,7 @@ elif st.session_state.workflow_state == 'debug':
     
     with col1:
         if st.button("🏠 Go to Start", width="stretch"):
-            st.session_state.workflow_state = 'slides_import'
-            st.rerun()
+            go_to_step('slides_import')
     
     with col2:
         if st.button("🔄 Reset Workflow", width="stretch"):
@@ -901,6 +1101,5 @@ elif st.session_state.workflow_state == 'debug':
     
     with col3:
         if st.button("📥 Go to Export", width="stretch"):
-            st.session_state.workflow_state = 'export'
-            st.rerun()
+            go_to_step('export')
 
@@ -3,11 +3,16 @@ import re
 import json
 import time
 import hashlib
+import functools
+import itertools
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import chromadb
 from sentence_transformers import SentenceTransformer
 
@@ -45,11 +50,31 @@ SOURCES = [
 # Embedding model (local)
 DEFAULT_EMBED_MODEL = os.environ.get("EMBED_MODEL", "all-MiniLM-L6-v2")
 
+# Chunks per collection.add call when (re)indexing
+CHROMA_ADD_BATCH = 166
+
+# Seconds between source refresh checks on the search path
+INDEX_CHECK_TTL = 600
+
+# HNSW index settings, applied when a collection is (re)created.
+# Embeddings are normalized, so cosine is the natural space.
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 64,
+}
+
 # Pandoc settings
 PANDOC_FROM = "html"
 PANDOC_TO = "gfm"
 PANDOC_EXTRA_ARGS = ["--wrap=none"]  # keep long lines; easier chunking
 
+# Markdown patterns used by normalization and chunking
+_RE_TRAIL_WS = re.compile(r"[ \t]+\n")
+_RE_MANY_BLANK = re.compile(r"\n{4,}")
+_RE_HEADING_LINE = re.compile(r"^(#{1,6})\s+(.*)$")
+
 
 mcp = FastMCP(
     "Google Gemini Python SDK Documentation RAG", 
@@ -61,8 +86,6 @@ mcp = FastMCP(
     """    
     )
 
-mcp = FastMCP()
-
 # ----------------------------
 # Utilities
 # ----------------------------
@@ -91,11 +114,9 @@ def _paths() -> Dict[str, str]:
         "norm_dir": norm_dir,
         "chroma_dir": chroma_dir,
         "meta_json": os.path.join(base, "meta.json"),
+        "embeds_npz": os.path.join(base, "embeds.npz"),
     }
 
-def _sha256_bytes(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()
-
 def _read_text(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
@@ -104,15 +125,59 @@ def _write_text(path: str, text: str) -> None:
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
 
-def _write_bytes(path: str, data: bytes) -> None:
-    with open(path, "wb") as f:
-        f.write(data)
+def _embed_device() -> str:
+    """
+    EMBED_DEVICE if set, otherwise CUDA when available, else CPU.
+    """
+    device = os.environ.get("EMBED_DEVICE")
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+@functools.lru_cache(maxsize=4)
+def _get_embedder(name: str) -> SentenceTransformer:
+    """
+    Load a SentenceTransformer once per process and reuse it across calls.
+    On CUDA the weights are cast to fp16, which roughly doubles encode throughput.
+    """
+    model = SentenceTransformer(name, device=_embed_device())
+    if model.device.type == "cuda":
+        model.half()
+    return model
 
-def _fetch(url: str) -> bytes:
-    r = requests.get(url, timeout=60)
-    r.raise_for_status()
-    return r.content
+# Shared session so repeated fetches reuse pooled TLS connections
+_http = requests.Session()
+_http.headers.update({"Accept-Encoding": "gzip", "User-Agent": "python-genai-docs-mcp/1"})
+_http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
 
+def _fetch_if_modified(url: str, prev: Dict[str, Any], dest_path: str) -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+    """
+    Conditional GET using the ETag / Last-Modified saved from the previous fetch.
+    The body is streamed straight to dest_path and hashed on the way through.
+    Returns (None, validators) on 304 Not Modified, else (sha256, validators).
+    """
+    headers = {}
+    if prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+
+    with _http.get(url, headers=headers, timeout=60, stream=True) as r:
+        if r.status_code == 304:
+            return None, {"etag": prev.get("etag"), "last_modified": prev.get("last_modified")}
+        r.raise_for_status()
+
+        hasher = hashlib.sha256()
+        tmp_path = dest_path + ".part"
+        with open(tmp_path, "wb") as f:
+            for chunk in r.iter_content(64 * 1024):
+                hasher.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_path, dest_path)
+        return hasher.hexdigest(), {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+
+@functools.lru_cache(maxsize=1)
 def _pandoc_available() -> bool:
     try:
         subprocess.run(["pandoc", "--version"], check=True, capture_output=True, text=True)
@@ -120,16 +185,16 @@ def _pandoc_available() -> bool:
     except Exception:
         return False
 
-def _convert_html_to_md_with_pandoc(html_bytes: bytes) -> str:
+def _convert_html_to_md_with_pandoc(html_path: str) -> str:
     """
-    Convert HTML bytes to GitHub-flavored Markdown using pandoc.
+    Convert an HTML file to GitHub-flavored Markdown using pandoc.
+    Pandoc reads the file itself, so the HTML never passes through our memory.
     """
     if not _pandoc_available():
         raise RuntimeError("Pandoc not found on PATH. Install pandoc or adjust PATH.")
 
     proc = subprocess.run(
-        ["pandoc", "-f", PANDOC_FROM, "-t", PANDOC_TO, *PANDOC_EXTRA_ARGS],
-        input=html_bytes,
+        ["pandoc", "-f", PANDOC_FROM, "-t", PANDOC_TO, *PANDOC_EXTRA_ARGS, html_path],
         capture_output=True,
         check=True,
     )
@@ -144,8 +209,8 @@ def _normalize_markdown(md: str) -> str:
     - trim trailing whitespace
     """
     md = md.replace("\r\n", "\n").replace("\r", "\n")
-    md = re.sub(r"[ \t]+\n", "\n", md)
-    md = re.sub(r"\n{4,}", "\n\n\n", md)
+    md = _RE_TRAIL_WS.sub("\n", md)
+    md = _RE_MANY_BLANK.sub("\n\n\n", md)
     return md.strip() + "\n"
 
 def _split_heading_blocks(text: str) -> List[str]:
@@ -154,13 +219,23 @@ def _split_heading_blocks(text: str) -> List[str]:
     Keeps headings with the content that follows.
     """
     text = text.replace("\r\n", "\n").replace("\r", "\n")
-    # Split before a heading line
-    parts = re.split(r"\n(?=#{1,6}\s)", text)
-    return [p.strip() for p in parts if p.strip()]
+    # Single pass over lines; start a new block at each heading line
+    blocks: List[str] = []
+    buf: List[str] = []
+    for ln in text.split("\n"):
+        if ln[:1] == "#":
+            rest = ln.lstrip("#")
+            if len(ln) - len(rest) <= 6 and (not rest or rest[0].isspace()) and buf:
+                blocks.append("\n".join(buf).strip())
+                buf = []
+        buf.append(ln)
+    if buf:
+        blocks.append("\n".join(buf).strip())
+    return [b for b in blocks if b]
 
 def _first_heading_title(block: str) -> str:
     first_line = block.split("\n", 1)[0].strip()
-    m = re.match(r"^(#{1,6})\s+(.*)$", first_line)
+    m = _RE_HEADING_LINE.match(first_line)
     return (m.group(2).strip() if m else "Docs")
 
 def _chunk_by_heading(text: str, max_chars: int = 5000) -> List[Dict[str, Any]]:
@@ -171,27 +246,31 @@ def _chunk_by_heading(text: str, max_chars: int = 5000) -> List[Dict[str, Any]]:
     blocks = _split_heading_blocks(text)
     chunks: List[Dict[str, Any]] = []
 
-    buf = ""
+    # Collect blocks and join once per chunk instead of re-concatenating
+    buf_parts: List[str] = []
+    buf_len = 0
     buf_title = ""
 
     def flush():
-        nonlocal buf, buf_title
-        if buf.strip():
-            chunks.append({"title": buf_title or "Docs", "text": buf.strip()})
-        buf = ""
+        nonlocal buf_parts, buf_len, buf_title
+        if buf_parts:
+            chunks.append({"title": buf_title or "Docs", "text": "\n\n".join(buf_parts)})
+        buf_parts = []
+        buf_len = 0
         buf_title = ""
 
     for block in blocks:
         block_title = _first_heading_title(block)
-        if not buf:
+        if not buf_parts:
             buf_title = block_title
 
         # If adding the block would exceed max, flush and start a new chunk
-        if len(buf) + len(block) + 2 > max_chars:
+        if buf_len + len(block) + 2 > max_chars:
             flush()
             buf_title = block_title
 
-        buf = (buf + "\n\n" + block).strip()
+        buf_len += len(block) + (2 if buf_parts else 0)
+        buf_parts.append(block)
 
     flush()
     return chunks
@@ -205,7 +284,7 @@ def _get_collection() -> chromadb.api.models.Collection.Collection:
     p = _paths()
     client = chromadb.PersistentClient(path=p["chroma_dir"])
     name = f"{BUNDLE_NAME}_{_bundle_key()}"
-    return client.get_or_create_collection(name=name)
+    return client.get_or_create_collection(name=name, metadata=HNSW_METADATA)
 
 def _load_meta() -> Dict[str, Any]:
     meta_path = _paths()["meta_json"]
@@ -221,6 +300,30 @@ def _save_meta(meta: Dict[str, Any]) -> None:
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2)
 
+def _load_embed_cache(model_name: str) -> Dict[str, np.ndarray]:
+    """
+    Chunk-hash -> embedding from the last index build (empty if the model changed).
+    """
+    path = _paths()["embeds_npz"]
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            if str(data["model"]) != model_name:
+                return {}
+            return dict(zip(data["hashes"].tolist(), data["embeddings"]))
+    except Exception:
+        return {}
+
+def _save_embed_cache(model_name: str, cache: Dict[str, np.ndarray]) -> None:
+    # float16 halves the file size; vectors are normalized so precision loss is negligible
+    np.savez(
+        _paths()["embeds_npz"],
+        model=np.array(model_name),
+        hashes=np.array(list(cache.keys()), dtype=str),
+        embeddings=np.array(list(cache.values()), dtype=np.float16),
+    )
+
 def _source_raw_path(source_id: str, ext: str) -> str:
     p = _paths()
     return os.path.join(p["raw_dir"], f"{source_id}.{ext}")
@@ -229,27 +332,27 @@ def _source_norm_path(source_id: str) -> str:
     p = _paths()
     return os.path.join(p["norm_dir"], f"{source_id}.md")
 
-def _clear_collection(collection) -> None:
+def _has_any(collection) -> bool:
+    """
+    Cheap existence probe; count() can scan the whole segment on large collections.
+    """
     try:
-        count = collection.count()
+        return bool(collection.peek(limit=1).get("ids"))
     except Exception:
-        count = 0
-    if count <= 0:
-        return
+        return False
 
-    # Delete ids in batches
-    offset = 0
-    all_ids: List[str] = []
-    while True:
-        batch = collection.get(limit=500, offset=offset, include=[])
-        ids = batch.get("ids", [])
-        if not ids:
-            break
-        all_ids.extend(ids)
-        offset += len(ids)
+def _clear_collection(collection) -> chromadb.api.models.Collection.Collection:
+    """
+    Drop and recreate the collection; everything is re-embedded anyway, so this
+    is cheaper than fetching every id just to delete it. Returns the new handle.
+    """
+    if not _has_any(collection):
+        return collection
 
-    if all_ids:
-        collection.delete(ids=all_ids)
+    p = _paths()
+    client = chromadb.PersistentClient(path=p["chroma_dir"])
+    client.delete_collection(name=collection.name)
+    return client.get_or_create_collection(name=collection.name, metadata=HNSW_METADATA)
 
 
 # ----------------------------
@@ -277,29 +380,45 @@ def _ingest_sources() -> Tuple[List[NormalizedDoc], Dict[str, Any]]:
     normalized_docs: List[NormalizedDoc] = []
     any_changed = False
 
-    for s in SOURCES:
-        raw_bytes = _fetch(s["url"])
-        raw_sha = _sha256_bytes(raw_bytes)
+    def _fetch_source(s: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+        prev = meta_sources.get(s["id"], {})
+        raw_ext = "html" if s["type"] == "html" else "md"
+        raw_path = _source_raw_path(s["id"], raw_ext)
+        # Only revalidate when the cached raw copy is still on disk
+        if not os.path.exists(raw_path):
+            prev = {}
+        return _fetch_if_modified(s["url"], prev, raw_path)
+
+    # Download all sources concurrently; processing below stays in order
+    with ThreadPoolExecutor(max_workers=len(SOURCES)) as ex:
+        raw_map = dict(zip([s["id"] for s in SOURCES], ex.map(_fetch_source, SOURCES)))
 
+    for s in SOURCES:
+        raw_sha, validators = raw_map[s["id"]]
         prev_sha = meta_sources.get(s["id"], {}).get("sha256")
-        changed = (prev_sha != raw_sha)
-        any_changed = any_changed or changed
 
-        # cache raw
         raw_ext = "html" if s["type"] == "html" else "md"
         raw_path = _source_raw_path(s["id"], raw_ext)
-        _write_bytes(raw_path, raw_bytes)
 
-        # normalize
-        if s["type"] == "md":
-            md = raw_bytes.decode("utf-8", errors="ignore")
-            md = _normalize_markdown(md)
-        else:
-            md = _convert_html_to_md_with_pandoc(raw_bytes)
-            md = _normalize_markdown(md)
+        if raw_sha is None:
+            # 304 Not Modified: the cached raw copy and its hash still apply
+            raw_sha = prev_sha
 
+        changed = (prev_sha != raw_sha)
+        any_changed = any_changed or changed
+
+        # normalize (reuse the previous output when the source is unchanged)
         norm_path = _source_norm_path(s["id"])
-        _write_text(norm_path, md)
+        if not changed and os.path.exists(norm_path):
+            md = _read_text(norm_path)
+        else:
+            if s["type"] == "md":
+                md = _read_text(raw_path)
+                md = _normalize_markdown(md)
+            else:
+                md = _convert_html_to_md_with_pandoc(raw_path)
+                md = _normalize_markdown(md)
+            _write_text(norm_path, md)
 
         normalized_docs.append(
             NormalizedDoc(
@@ -314,6 +433,8 @@ def _ingest_sources() -> Tuple[List[NormalizedDoc], Dict[str, Any]]:
         meta_sources[s["id"]] = {
             "url": s["url"],
             "sha256": raw_sha,
+            "etag": validators["etag"],
+            "last_modified": validators["last_modified"],
             "raw_path": raw_path,
             "normalized_path": norm_path,
             "type": s["type"],
@@ -326,6 +447,20 @@ def _ingest_sources() -> Tuple[List[NormalizedDoc], Dict[str, Any]]:
     return normalized_docs, meta_update
 
 
+def _iter_chunks(docs: List[NormalizedDoc]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Yield (chunk_id, text, metadata) for every chunk of every doc, in order.
+    """
+    for d in docs:
+        for i, ch in enumerate(_chunk_by_heading(d.text, max_chars=5000)):
+            yield f"{d.source_id}__chunk_{i}", ch["text"], {
+                "source_id": d.source_id,
+                "source_title": d.source_title,
+                "source_url": d.source_url,
+                "heading": ch["title"],
+                "chunk_index": i,
+            }
+
 def _ensure_index(force: bool = False) -> Dict[str, Any]:
     """
     Re-index if any source hash changed, or if force=True, or if collection empty.
@@ -335,49 +470,68 @@ def _ensure_index(force: bool = False) -> Dict[str, Any]:
     any_changed = meta_update["any_changed"]
 
     collection = _get_collection()
-    try:
-        existing_count = collection.count()
-    except Exception:
-        existing_count = 0
 
-    if not force and not any_changed and existing_count > 0:
+    if not force and not any_changed and _has_any(collection):
+        chunk_count = meta.get("chunk_count")
+        if chunk_count is None:
+            chunk_count = collection.count()
         return {
             "reindexed": False,
-            "chunk_count": existing_count,
+            "chunk_count": chunk_count,
             "last_indexed_at": meta.get("last_indexed_at"),
             "sources": meta.get("sources", {}),
         }
 
     # rebuild
-    _clear_collection(collection)
-
-    embedder = SentenceTransformer(DEFAULT_EMBED_MODEL)
+    collection = _clear_collection(collection)
+
+    # Chunk, embed and add one window at a time so only CHROMA_ADD_BATCH chunks
+    # (and their embeddings) are held in memory at once. Within a window, misses
+    # go through a single encode call so SentenceTransformer can length-sort them
+    # into batches and pad each batch only to its own max.
+    embed_cache = _load_embed_cache(DEFAULT_EMBED_MODEL)
+    kept_cache: Dict[str, np.ndarray] = {}
+    chunk_total = 0
 
-    ids: List[str] = []
-    documents: List[str] = []
-    metadatas: List[Dict[str, Any]] = []
+    chunk_iter = _iter_chunks(docs)
+    while True:
+        window = list(itertools.islice(chunk_iter, CHROMA_ADD_BATCH))
+        if not window:
+            break
+        ids = [c[0] for c in window]
+        documents = [c[1] for c in window]
+        metadatas = [c[2] for c in window]
+
+        # Reuse embeddings of unchanged chunks; only new or edited text is encoded
+        chunk_hashes = [hashlib.sha1(doc.encode("utf-8")).hexdigest() for doc in documents]
+        misses = [i for i, h in enumerate(chunk_hashes) if h not in embed_cache]
+        if misses:
+            encoded = _get_embedder(DEFAULT_EMBED_MODEL).encode(
+                [documents[i] for i in misses],
+                batch_size=64,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            for i, emb in zip(misses, encoded):
+                embed_cache[chunk_hashes[i]] = emb
+
+        collection.add(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=[embed_cache[h].tolist() for h in chunk_hashes],
+        )
 
-    chunk_total = 0
-    for d in docs:
-        chunks = _chunk_by_heading(d.text, max_chars=5000)
-        for i, ch in enumerate(chunks):
-            chunk_id = f"{d.source_id}__chunk_{i}"
-            ids.append(chunk_id)
-            documents.append(ch["text"])
-            metadatas.append({
-                "source_id": d.source_id,
-                "source_title": d.source_title,
-                "source_url": d.source_url,
-                "heading": ch["title"],
-                "chunk_index": i,
-            })
-        chunk_total += len(chunks)
+        # keep only the current chunks so the cache doesn't grow without bound
+        for h in chunk_hashes:
+            kept_cache[h] = embed_cache[h]
+        chunk_total += len(window)
 
-    # embed + add
-    embeddings = embedder.encode(documents, normalize_embeddings=True).tolist()
-    collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+    _save_embed_cache(DEFAULT_EMBED_MODEL, kept_cache)
 
     meta["last_indexed_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    meta["chunk_count"] = chunk_total
     _save_meta(meta)
 
     return {
@@ -388,6 +542,23 @@ def _ensure_index(force: bool = False) -> Dict[str, Any]:
     }
 
 
+# (monotonic time of last check, index info)
+_last_index_check: Optional[Tuple[float, Dict[str, Any]]] = None
+
+def _ensure_index_throttled() -> Dict[str, Any]:
+    """
+    _ensure_index(force=False), but at most once per INDEX_CHECK_TTL so searches
+    don't pay a network round-trip to every source on each call.
+    """
+    global _last_index_check
+    now = time.monotonic()
+    if _last_index_check and now - _last_index_check[0] < INDEX_CHECK_TTL:
+        return _last_index_check[1]
+    info = _ensure_index(force=False)
+    _last_index_check = (now, info)
+    return info
+
+
 # ----------------------------
 # MCP Tools
 # ----------------------------
@@ -419,7 +590,10 @@ def gemini_python_sdk_docs_reindex(force: bool = False) -> Dict[str, Any]:
     """
     Force or refresh the index if sources changed.
     """
-    return _ensure_index(force=force)
+    global _last_index_check
+    info = _ensure_index(force=force)
+    _last_index_check = (time.monotonic(), info)
+    return info
 
 
 @mcp.tool()
@@ -434,10 +608,10 @@ def gemini_python_sdk_docs_search(query: str, k: int = 6, sources: Optional[List
 
     Optionally filter by sources (list of source_id values).
     """
-    index_info = _ensure_index(force=False)
+    index_info = _ensure_index_throttled()
     collection = _get_collection()
 
-    embedder = SentenceTransformer(DEFAULT_EMBED_MODEL)
+    embedder = _get_embedder(DEFAULT_EMBED_MODEL)
     q_emb = embedder.encode([query], normalize_embeddings=True).tolist()[0]
 
     # Pull more than k first if filtering, then filter down.
@@ -473,4 +647,11 @@ def gemini_python_sdk_docs_search(query: str, k: int = 6, sources: Optional[List
 # ----------------------------
 
 if __name__ == "__main__":
+    # Build/refresh the index and load the model before the first search arrives
+    try:
+        _ensure_index_throttled()
+    except Exception:
+        pass  # offline at startup; the first search will retry
+    _get_embedder(DEFAULT_EMBED_MODEL)
+
     mcp.run(transport="stdio")
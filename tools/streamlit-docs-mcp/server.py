@@ -1,10 +1,13 @@
 import os
 import re
 import json
+import time
 import hashlib
-from typing import List, Dict, Any
+import functools
+from typing import List, Dict, Any, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 import chromadb
 from sentence_transformers import SentenceTransformer
 
@@ -13,6 +16,13 @@ from mcp.server.fastmcp import FastMCP
 DOC_URL_DEFAULT = "https://docs.streamlit.io/llms-full.txt"
 ADK_DOC_URL_DEFAULT = "https://raw.githubusercontent.com/google/adk-python/refs/heads/main/llms-full.txt"
 APP_NAME = "streamlit-docs-rag"
+DEFAULT_EMBED_MODEL = os.environ.get("EMBED_MODEL", "all-MiniLM-L6-v2")
+CHROMA_ADD_BATCH = 166  # chunks per collection.add call when (re)indexing
+INDEX_CHECK_TTL = 600  # seconds between source refresh checks per doc URL
+# HNSW settings applied when a collection is (re)created; embeddings are normalized
+HNSW_METADATA = {"hnsw:space": "cosine", "hnsw:construction_ef": 200, "hnsw:M": 32, "hnsw:search_ef": 64}
+
+_RE_HEADING_LINE = re.compile(r"^(#+)\s+(.*)$")
 
 mcp = FastMCP("Streamlit Docs RAG (local)", json_response=True)
 
@@ -29,11 +39,33 @@ def _data_paths() -> Dict[str, str]:
         "chroma": os.path.join(base, "chroma"),
     }
 
-def _sha256_bytes(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()
+def _sha256_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def _embed_device() -> str:
+    # EMBED_DEVICE wins; otherwise use CUDA when available
+    device = os.environ.get("EMBED_DEVICE")
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+@functools.lru_cache(maxsize=4)
+def _get_embedder(name: str) -> SentenceTransformer:
+    # Loading the model dominates query latency; keep one per process
+    model = SentenceTransformer(name, device=_embed_device())
+    if model.device.type == "cuda":
+        model.half()  # fp16 on GPU roughly doubles encode throughput
+    return model
+
+# Shared session so repeated fetches reuse pooled TLS connections
+_http = requests.Session()
+_http.headers.update({"Accept-Encoding": "gzip", "User-Agent": "streamlit-docs-mcp/1"})
+_http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
 
 def _fetch_doc(doc_url: str) -> bytes:
-    r = requests.get(doc_url, timeout=60)
+    r = _http.get(doc_url, timeout=60)
     r.raise_for_status()
     return r.content
 
@@ -41,8 +73,10 @@ def _load_or_refresh_raw(doc_url: str) -> Dict[str, Any]:
     paths = _data_paths()
     meta_path = paths["meta"]
 
-    raw_bytes = _fetch_doc(doc_url)
-    new_hash = _sha256_bytes(raw_bytes)
+    # Always write latest raw (so your cache is consistent), then hash the file
+    with open(paths["raw"], "wb") as f:
+        f.write(_fetch_doc(doc_url))
+    new_hash = _sha256_file(paths["raw"])
 
     meta = {"doc_url": doc_url, "sha256": None}
     if os.path.exists(meta_path):
@@ -53,16 +87,27 @@ def _load_or_refresh_raw(doc_url: str) -> Dict[str, Any]:
 
     changed = meta.get("sha256") != new_hash
 
-    # Always write latest raw (so your cache is consistent)
-    with open(paths["raw"], "wb") as f:
-        f.write(raw_bytes)
-
     meta = {"doc_url": doc_url, "sha256": new_hash}
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f)
 
     return {"changed": changed, "sha256": new_hash, "raw_path": paths["raw"]}
 
+def _split_heading_blocks(text: str) -> List[str]:
+    # Single pass over lines; start a new block at each heading line
+    blocks: List[str] = []
+    buf: List[str] = []
+    for ln in text.split("\n"):
+        if ln[:1] == "#" and buf:
+            rest = ln.lstrip("#")
+            if not rest or rest[0].isspace():
+                blocks.append("\n".join(buf).strip())
+                buf = []
+        buf.append(ln)
+    if buf:
+        blocks.append("\n".join(buf).strip())
+    return [b for b in blocks if b]
+
 def _chunk_markdown(text: str, max_chars: int = 3500) -> List[Dict[str, str]]:
     """
     Simple chunker:
@@ -73,34 +118,37 @@ def _chunk_markdown(text: str, max_chars: int = 3500) -> List[Dict[str, str]]:
     text = text.replace("\r\n", "\n").replace("\r", "\n")
 
     # Split into heading blocks
-    parts = re.split(r"\n(?=#+\s)", text)
-    blocks = [p.strip() for p in parts if p.strip()]
+    blocks = _split_heading_blocks(text)
 
     chunks: List[Dict[str, str]] = []
-    buf = ""
+    # Collect blocks and join once per chunk instead of re-concatenating
+    buf_parts: List[str] = []
+    buf_len = 0
     title = ""
 
     def flush():
-        nonlocal buf, title
-        if buf.strip():
-            chunks.append({"title": title.strip() or "Streamlit Docs", "text": buf.strip()})
-        buf = ""
+        nonlocal buf_parts, buf_len, title
+        if buf_parts:
+            chunks.append({"title": title.strip() or "Streamlit Docs", "text": "\n\n".join(buf_parts)})
+        buf_parts = []
+        buf_len = 0
         title = ""
 
     for block in blocks:
         # Identify the first heading as title
-        m = re.match(r"^(#+)\s+(.*)$", block.split("\n", 1)[0].strip())
+        m = _RE_HEADING_LINE.match(block.split("\n", 1)[0].strip())
         block_title = m.group(2).strip() if m else "Streamlit Docs"
 
         # Start a new chunk if needed
-        if not buf:
+        if not buf_parts:
             title = block_title
 
-        if len(buf) + len(block) + 2 > max_chars:
+        if buf_len + len(block) + 2 > max_chars:
             flush()
             title = block_title
 
-        buf = (buf + "\n\n" + block).strip()
+        buf_len += len(block) + (2 if buf_parts else 0)
+        buf_parts.append(block)
 
     flush()
     return chunks
@@ -110,7 +158,14 @@ def _get_collection(doc_url: str):
     client = chromadb.PersistentClient(path=paths["chroma"])
     # Make collection name stable per URL (supports multiple doc sources later)
     name = "streamlit_llms_full_" + hashlib.md5(doc_url.encode("utf-8")).hexdigest()
-    return client.get_or_create_collection(name=name)
+    return client.get_or_create_collection(name=name, metadata=HNSW_METADATA)
+
+def _has_any(collection) -> bool:
+    # Cheap existence probe; count() can scan the whole segment on large collections
+    try:
+        return bool(collection.peek(limit=1).get("ids"))
+    except Exception:
+        return False
 
 def _ensure_index(doc_url: str) -> Dict[str, Any]:
     refresh = _load_or_refresh_raw(doc_url)
@@ -118,53 +173,60 @@ def _ensure_index(doc_url: str) -> Dict[str, Any]:
 
     collection = _get_collection(doc_url)
     # If doc changed OR collection empty -> rebuild
-    existing_count = 0
-    try:
-        existing_count = collection.count()
-    except Exception:
-        existing_count = 0
+    has_existing = _has_any(collection)
 
-    if (not refresh["changed"]) and existing_count > 0:
-        return {"reindexed": False, "count": existing_count, "sha256": refresh["sha256"]}
+    if (not refresh["changed"]) and has_existing:
+        return {"reindexed": False, "count": collection.count(), "sha256": refresh["sha256"]}
 
     # Rebuild
     raw_text = open(paths["raw"], "r", encoding="utf-8", errors="ignore").read()
     chunks = _chunk_markdown(raw_text)
 
     # Clear collection (Chroma doesn't have "truncate" consistently across versions; easiest: delete+recreate)
-    # We'll delete by ids if any exist.
     try:
-        if existing_count > 0:
-            # Pull all ids in batches
-            all_ids = []
-            offset = 0
-            while True:
-                batch = collection.get(limit=500, offset=offset, include=[])
-                ids = batch.get("ids", [])
-                if not ids:
-                    break
-                all_ids.extend(ids)
-                offset += len(ids)
-            if all_ids:
-                collection.delete(ids=all_ids)
+        if has_existing:
+            client = chromadb.PersistentClient(path=paths["chroma"])
+            client.delete_collection(name=collection.name)
+            collection = client.get_or_create_collection(name=collection.name, metadata=HNSW_METADATA)
     except Exception:
         pass
 
-    embedder = SentenceTransformer(os.environ.get("EMBED_MODEL", "all-MiniLM-L6-v2"))
-
-    ids = []
-    documents = []
-    metadatas = []
-
-    for i, ch in enumerate(chunks):
-        ids.append(f"chunk_{i}")
-        documents.append(ch["text"])
-        metadatas.append({"title": ch["title"], "chunk_index": i})
-
-    embeddings = embedder.encode(documents, normalize_embeddings=True).tolist()
-    collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
-
-    return {"reindexed": True, "count": len(ids), "sha256": refresh["sha256"]}
+    embedder = _get_embedder(DEFAULT_EMBED_MODEL)
+
+    # Embed and add one window at a time so only CHROMA_ADD_BATCH embeddings are
+    # held in memory; each window is still a single encode call, so
+    # SentenceTransformer can length-sort it into batches (smart batching)
+    for start in range(0, len(chunks), CHROMA_ADD_BATCH):
+        window = chunks[start:start + CHROMA_ADD_BATCH]
+        documents = [ch["text"] for ch in window]
+        embeddings = embedder.encode(
+            documents,
+            batch_size=64,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).tolist()
+        collection.add(
+            ids=[f"chunk_{start + j}" for j in range(len(window))],
+            documents=documents,
+            metadatas=[{"title": ch["title"], "chunk_index": start + j} for j, ch in enumerate(window)],
+            embeddings=embeddings,
+        )
+
+    return {"reindexed": True, "count": len(chunks), "sha256": refresh["sha256"]}
+
+# doc_url -> (monotonic time of last check, index info)
+_last_index_check: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+def _ensure_index_throttled(doc_url: str) -> Dict[str, Any]:
+    # Searches skip the network round-trip unless the last check is older than the TTL
+    now = time.monotonic()
+    hit = _last_index_check.get(doc_url)
+    if hit and now - hit[0] < INDEX_CHECK_TTL:
+        return hit[1]
+    info = _ensure_index(doc_url)
+    _last_index_check[doc_url] = (now, info)
+    return info
 
 @mcp.tool()
 def streamlit_docs_search(query: str, k: int = 6, doc_url: str = DOC_URL_DEFAULT) -> Dict[str, Any]:
@@ -172,10 +234,10 @@ def streamlit_docs_search(query: str, k: int = 6, doc_url: str = DOC_URL_DEFAULT
     Search Streamlit documentation (llms-full.txt) using embeddings.
     Returns the top-k relevant chunks with titles and text excerpts.
     """
-    info = _ensure_index(doc_url)
+    info = _ensure_index_throttled(doc_url)
     collection = _get_collection(doc_url)
 
-    embedder = SentenceTransformer(os.environ.get("EMBED_MODEL", "all-MiniLM-L6-v2"))
+    embedder = _get_embedder(DEFAULT_EMBED_MODEL)
     q_emb = embedder.encode([query], normalize_embeddings=True).tolist()[0]
 
     res = collection.query(query_embeddings=[q_emb], n_results=max(1, min(k, 12)), include=["documents", "metadatas", "distances"])
@@ -196,10 +258,10 @@ def gemini_adk_docs_search(query: str, k: int = 6, doc_url: str = ADK_DOC_URL_DE
     Search Gemini ADK (adk-python) documentation (llms-full.txt) using embeddings.
     Returns the top-k relevant chunks with titles and text excerpts.
     """
-    info = _ensure_index(doc_url)
+    info = _ensure_index_throttled(doc_url)
     collection = _get_collection(doc_url)
 
-    embedder = SentenceTransformer(os.environ.get("EMBED_MODEL", "all-MiniLM-L6-v2"))
+    embedder = _get_embedder(DEFAULT_EMBED_MODEL)
     q_emb = embedder.encode([query], normalize_embeddings=True).tolist()[0]
 
     res = collection.query(
@@ -221,5 +283,12 @@ def gemini_adk_docs_search(query: str, k: int = 6, doc_url: str = ADK_DOC_URL_DE
 
 
 if __name__ == "__main__":
+    # Build/refresh the index and load the model before the first search arrives
+    try:
+        _ensure_index_throttled(DOC_URL_DEFAULT)
+    except Exception:
+        pass  # offline at startup; the first search will retry
+    _get_embedder(DEFAULT_EMBED_MODEL)
+
     # Run as STDIO server for Roo
     mcp.run(transport="stdio")
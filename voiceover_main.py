@@ -5,17 +5,14 @@ This app uses direct Gemini API calls to generate and refine voiceover scripts,
 with human review and editing between each step.
 
 This is the main entry point for the Streamlit application. It handles
-global configurations, Google OAuth, cached resources, and session state
-initialization. Individual workflow steps are implemented as separate pages
-in the `pages/` directory.
+global configurations and session state initialization. Cached API clients
+live in `helpers/` so pages never import (and re-execute) this script.
+Individual workflow steps are implemented as separate pages in the
+`custom_pages/` directory.
 """
 
+import threading
 import streamlit as st
-import base64
-from google import genai
-from google_auth_oauthlib.flow import Flow
-from helpers.gemini_helpers import generate_voiceover_scenes, add_elevenlabs_tags
-from helpers.google_slides_helpers import get_slides_data_cached, slides_to_pdf
 
 
 # ============================================
@@ -33,63 +30,68 @@ st.caption("Generate and refine educational voiceover scripts from PDF slides")
 
 
 # ============================================
-# Cached Resources (Singletons)
+# Session State Initialization
 # ============================================
 
-@st.cache_resource
-def get_gemini_client():
-    """Initialize and cache the Gemini client."""
-    api_key = st.secrets.get("GEMINI_API_KEY", None)
-    if not api_key:
-        api_key = st.session_state.get("gemini_api_key", None)
-    
-    if not api_key:
-        st.error("❌ GEMINI_API_KEY not found in Streamlit secrets or session state. Please add it.")
-        st.stop()
-    return genai.Client(api_key=api_key)
-
-
-@st.cache_data
-def process_pdf(pdf_bytes):
-    """Process and cache PDF data."""
-    pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-    return {
-        'base64': pdf_base64,
-        'size': len(pdf_bytes)
-    }
+# Default value for every session state key the pages rely on
+SESSION_DEFAULTS = {
+    # Common state that pages might use
+    'is_processing': False,
+    # These will be populated by the pages later, but initialize them here for consistency
+    'slides_data': None,
+    'pdf_bytes': None,
+    'scenes': None,
+    'refined_scenes': None,
+    'voiceover_approved': False,
+    'final_approved': False,
+    'gemini_api_key': '',
+    'elevenlabs_api_key': '',
+}
 
+# Set once defaults are applied; pages that delete workflow keys delete this too
+SESSION_INITIALIZED_KEY = '_session_initialized'
 
-# ============================================
-# Session State Initialization
-# ============================================
 
 def initialize_session_state():
-    """Initialize all session state keys with defaults."""
-    # Initialize common session state variables that pages might use
-    if 'is_processing' not in st.session_state:
-        st.session_state.is_processing = False
-    
-    # These will be populated by the pages later, but initialize them here for consistency
-    if 'slides_data' not in st.session_state:
-        st.session_state.slides_data = None
-    if 'pdf_base64' not in st.session_state:
-        st.session_state.pdf_base64 = None
-    if 'scenes' not in st.session_state:
-        st.session_state.scenes = None
-    if 'refined_scenes' not in st.session_state:
-        st.session_state.refined_scenes = None
-    if 'voiceover_approved' not in st.session_state:
-        st.session_state.voiceover_approved = False
-    if 'final_approved' not in st.session_state:
-        st.session_state.final_approved = False
-    if 'gemini_api_key' not in st.session_state:
-        st.session_state.gemini_api_key = ''
-    if 'elevenlabs_api_key' not in st.session_state:
-        st.session_state.elevenlabs_api_key = ''
-
+    """Initialize all session state keys with defaults, once per session."""
+    if st.session_state.get(SESSION_INITIALIZED_KEY):
+        return
+    for key, value in SESSION_DEFAULTS.items():
+        st.session_state.setdefault(key, value)
+    st.session_state[SESSION_INITIALIZED_KEY] = True
+
+
+def _warm_resources():
+    """
+    Populate the shared cache_resource factories whose config lives in secrets.
+    Each factory is only called when its secret is set, so their st.error/st.stop
+    paths are never reached from this thread.
+    """
+    if st.secrets.get("CLIENT_CONFIG"):
+        from helpers.google_auth_helpers import get_google_oauth_flow
+        get_google_oauth_flow()
+    if st.secrets.get("GEMINI_API_KEY"):
+        from helpers.gemini_helpers import get_gemini_client
+        get_gemini_client()
+
+
+@st.cache_resource(show_spinner=False)
+def warm_cached_resources():
+    """
+    Build the OAuth flow and Gemini client on a background thread, once per server process.
+    The script keeps rendering meanwhile; a page that needs either before the
+    thread finishes waits on the same cache entry instead of building another.
+    Resources configured only through a user's session are left to first use.
+    The thread is deliberately not attached to this session's script run, so it
+    can never draw into a page whose run has already ended.
+    """
+    thread = threading.Thread(target=_warm_resources, name="warm-cached-resources", daemon=True)
+    thread.start()
+    return thread
 
 
 initialize_session_state()
+warm_cached_resources()
 
 
 # ============================================
@@ -114,21 +116,21 @@ pg.run()
 # Sidebar - Developer Options
 # ============================================
 
+# Developer actions and the message shown once each is done
+DEV_ACTIONS = {
+    "Clear Resource Cache": (st.cache_resource.clear, "Agent cache cleared!"),
+    "Clear Data Cache": (st.cache_data.clear, "Data cache cleared!"),
+    "Reset All Session State": (st.session_state.clear, "Session reset!"),
+}
+
 with st.sidebar:
-    # Developer options
+    # Developer options: one picker and one button instead of a button per action
     with st.expander("🔧 Developer Options"):
-        if st.button("Clear Resource Cache"):
-            st.cache_resource.clear()
-            st.success("Agent cache cleared!")
-            st.rerun()
-        
-        if st.button("Clear Data Cache"):
-            st.cache_data.clear()
-            st.success("Data cache cleared!")
-            st.rerun()
+        dev_action = st.radio("Action", tuple(DEV_ACTIONS), index=None)
         
-        if st.button("Reset All Session State"):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            st.success("Session reset!")
+        if st.button("Apply", disabled=dev_action is None):
+            action, message = DEV_ACTIONS[dev_action]
+            action()
+            # A toast survives the rerun, unlike st.success
+            st.toast(message)
             st.rerun()